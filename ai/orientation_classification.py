@@ -4,6 +4,7 @@ Takes a NIfTI file and predicts the orientation of a single slice.
 """
 
 import os
+import contextlib
 import torch
 import torch.nn as nn
 import numpy as np
@@ -20,6 +21,11 @@ IMAGE_SIZE = (1024, 1024)
 NUM_CLASSES = 3
 
 LABEL_MAP = {0: 'Axial', 1: 'Coronal', 2: 'Sagittal'}
+ONNX_OPSET = 17
+# Exported ONNX graphs, kept out of the repo next to the other user caches
+ONNX_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "multi-planar-viewer", "onnx")
+# ONNX Runtime provider that has to be available for each torch device type
+ONNX_PROVIDERS = {'cuda': 'CUDAExecutionProvider', 'cpu': 'CPUExecutionProvider'}
 
 # ============================================================================
 # MODEL CLASS (same as training)
@@ -73,7 +79,7 @@ class MRIOrientationClassifier:
     Loads a checkpoint and predicts the orientation of a single slice.
     """
     
-    def __init__(self, checkpoint_path, mri_foundation_path=None, device=None, image_size=IMAGE_SIZE):
+    def __init__(self, checkpoint_path, mri_foundation_path=None, device=None, image_size=IMAGE_SIZE, use_onnx=True):
         """
         Initialize the classifier.
         
@@ -82,6 +88,8 @@ class MRIOrientationClassifier:
             mri_foundation_path (str): Path to cloned MRI Foundation repo (required for SAM)
             device (str): Device to run inference on ('cuda' or 'cpu'). Defaults to CUDA if available.
             image_size (tuple): Input image size (height, width)
+            use_onnx (bool): Run inference with ONNX Runtime when it's installed, exporting
+                             the checkpoint to ONNX_CACHE_DIR the first time
         """
         self.checkpoint_path = checkpoint_path
         self.image_size = image_size
@@ -102,6 +110,7 @@ class MRIOrientationClassifier:
         
         # Load model
         self.model = self._load_model()
+        self.ort_session = self._load_onnx_session() if use_onnx else None
         
         # Setup transforms
         self.transform = transforms.Compose([
@@ -110,6 +119,47 @@ class MRIOrientationClassifier:
                                std=[0.229, 0.224, 0.225])
         ])
     
+    def _load_onnx_session(self):
+        """
+        ONNX Runtime session for the model (exported once), or None to use PyTorch,
+        also when ONNX Runtime has no provider for self.device (e.g. the CPU-only
+        wheel on a CUDA machine)
+        """
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            return None
+        
+        provider = ONNX_PROVIDERS.get(self.device.type)
+        if provider not in ort.get_available_providers():
+            return None
+        
+        try:
+            # Named after the checkpoint's size and mtime (and the input size baked into
+            # the graph), so a replaced or different same-named checkpoint is re-exported
+            st = os.stat(self.checkpoint_path)
+            stem = os.path.splitext(os.path.basename(self.checkpoint_path))[0]
+            onnx_name = (f"{stem}-{st.st_size}-{st.st_mtime_ns}"
+                         f"-{self.image_size[0]}x{self.image_size[1]}.onnx")
+            onnx_path = os.path.join(ONNX_CACHE_DIR, onnx_name)
+            if not os.path.exists(onnx_path):
+                print(f"Exporting model to ONNX: {onnx_path}")
+                os.makedirs(ONNX_CACHE_DIR, exist_ok=True)
+                dummy_input = torch.zeros(1, 3, *self.image_size, device=self.device)
+                torch.onnx.export(
+                    self.model, dummy_input, onnx_path,
+                    input_names=['input'], output_names=['logits'],
+                    dynamic_axes={'input': {0: 'batch'}, 'logits': {0: 'batch'}},
+                    opset_version=ONNX_OPSET,
+                )
+            
+            options = ort.SessionOptions()
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            return ort.InferenceSession(onnx_path, options, providers=[provider])
+        except Exception as e:
+            print(f"ONNX Runtime unavailable for this model, using PyTorch: {e}")
+            return None
+    
     def _load_model(self):
         """Load the fine-tuned model from checkpoint"""
         print(f"Loading model from: {self.checkpoint_path}")
@@ -231,6 +281,35 @@ class MRIOrientationClassifier:
         
         return prediction
     
+    def predict_batch(self, nifti, slice_indices):
+        """
+        Predict orientation of several slices of a NIfTI image in one forward pass.
+        
+        Args:
+            nifti (nib.Nifti1Image): Loaded NIfTI image
+            slice_indices (list): Indices of the slices (along the third axis) to predict
+        
+        Returns:
+            list: One result dict per slice, as returned by predict_from_array
+        """
+        tensors = []
+        for slice_index in slice_indices:
+            if slice_index >= nifti.shape[2]:
+                raise ValueError(f"Slice index {slice_index} out of range. Max: {nifti.shape[2]-1}")
+            # Read just this slice, not the whole volume
+            slice_data = np.asanyarray(nifti.dataobj[:, :, slice_index], dtype=np.float64)
+            
+            # Normalize to [0, 1]
+            slice_min = slice_data.min()
+            slice_max = slice_data.max()
+            if slice_max > slice_min:
+                slice_data = (slice_data - slice_min) / (slice_max - slice_min)
+            tensors.append(self._to_tensor(slice_data))
+        
+        probabilities = self._predict_probabilities(torch.stack(tensors))
+        
+        return [self._to_result(row) for row in probabilities]
+    
     def predict_from_array(self, image_array):
         """
         Predict orientation from a numpy array (2D image).
@@ -242,6 +321,13 @@ class MRIOrientationClassifier:
             dict: Contains 'orientation' (label name), 'label' (class index), 
                   and 'confidence' (softmax probability)
         """
+        # Apply transforms
+        img_tensor = self._to_tensor(image_array).unsqueeze(0)
+        
+        return self._to_result(self._predict_probabilities(img_tensor)[0])
+    
+    def _to_tensor(self, image_array):
+        """Normalized [3, H, W] model input for a 2D array in [0, 1] (or uint8)"""
         # Convert to PIL Image
         if image_array.dtype == np.uint8:
             img = Image.fromarray(image_array, mode='L')
@@ -257,30 +343,58 @@ class MRIOrientationClassifier:
         if img_rgb.size != self.image_size:
             img_rgb = img_rgb.resize(self.image_size, Image.BILINEAR)
         
-        # Apply transforms
-        img_tensor = self.transform(img_rgb).unsqueeze(0).to(self.device)
-        
-        # Predict
-        with torch.no_grad():
-            outputs = self.model(img_tensor)
-            probabilities = torch.softmax(outputs, dim=1)
-            confidence, predicted_label = torch.max(probabilities, 1)
-        
+        return self.transform(img_rgb)
+    
+    def _predict_probabilities(self, batch):
+        """Softmax probabilities [N, classes] for a CPU input batch [N, 3, H, W]"""
+        if self.ort_session is not None:
+            logits = self.ort_session.run(None, {'input': batch.numpy()})[0]
+            return torch.softmax(torch.from_numpy(logits), dim=1)
+        
+        with torch.inference_mode(), self._fast_cuda_kernels():
+            outputs = self.model(self._to_device(batch))
+            return torch.softmax(outputs, dim=1)
+    
+    @contextlib.contextmanager
+    def _fast_cuda_kernels(self):
+        """
+        On CUDA, let cuDNN pick the fastest kernels for the fixed input size and allow
+        TF32 matmuls on Ampere+ GPUs, only for the duration of the block (both are
+        process-wide settings)
+        """
+        if self.device.type != "cuda":
+            yield
+            return
+        precision = torch.get_float32_matmul_precision()
+        torch.set_float32_matmul_precision('high')
+        try:
+            with torch.backends.cudnn.flags(enabled=torch.backends.cudnn.enabled, benchmark=True,
+                                            deterministic=torch.backends.cudnn.deterministic,
+                                            allow_tf32=torch.backends.cudnn.allow_tf32):
+                yield
+        finally:
+            torch.set_float32_matmul_precision(precision)
+    
+    def _to_device(self, tensor):
+        """Move an input batch to the model's device (through pinned memory for an async GPU copy)"""
+        if self.device.type == "cuda":
+            return tensor.pin_memory().to(self.device, non_blocking=True)
+        return tensor.to(self.device)
+    
+    def _to_result(self, probabilities):
+        """Result dict for one row of softmax probabilities"""
+        confidence, predicted_label = torch.max(probabilities, 0)
         predicted_label = predicted_label.item()
-        confidence = confidence.item()
-        orientation = self.label_map[predicted_label]
         
-        result = {
-            'orientation': orientation,
+        return {
+            'orientation': self.label_map[predicted_label],
             'label': predicted_label,
-            'confidence': confidence,
+            'confidence': confidence.item(),
             'all_probabilities': {
-                self.label_map[i]: probabilities[0, i].item()
+                self.label_map[i]: probabilities[i].item()
                 for i in range(NUM_CLASSES)
             }
         }
-        
-        return result
     
     def predict_from_image(self, image_path):
         """
@@ -305,29 +419,9 @@ class MRIOrientationClassifier:
             img = img.resize(self.image_size, Image.BILINEAR)
         
         # Apply transforms
-        img_tensor = self.transform(img).unsqueeze(0).to(self.device)
-        
-        # Predict
-        with torch.no_grad():
-            outputs = self.model(img_tensor)
-            probabilities = torch.softmax(outputs, dim=1)
-            confidence, predicted_label = torch.max(probabilities, 1)
-        
-        predicted_label = predicted_label.item()
-        confidence = confidence.item()
-        orientation = self.label_map[predicted_label]
-        
-        result = {
-            'orientation': orientation,
-            'label': predicted_label,
-            'confidence': confidence,
-            'all_probabilities': {
-                self.label_map[i]: probabilities[0, i].item()
-                for i in range(NUM_CLASSES)
-            }
-        }
+        img_tensor = self.transform(img).unsqueeze(0)
         
-        return result
+        return self._to_result(self._predict_probabilities(img_tensor)[0])
 
 
 # ============================================================================
@@ -1,128 +1,475 @@
 import os
 import csv
+import json
+import hashlib
 import nibabel as nib
 import numpy as np
 import shutil
+import atexit
+import queue
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from totalsegmentator.python_api import totalsegmentator
 
+try:
+    from numba import njit
+except ImportError:  # numba is optional, NumPy reductions are used without it
+    njit = None
+
+# Number of z-planes read and reduced together when scanning organ masks
+SLAB_DEPTH = 16
+# Upper bound on organ files scanned concurrently
+MAX_WORKERS = 8
+# Write buffer for the slice/organ CSV
+CSV_BUFFER_SIZE = 1 << 20
+# Sidecar recording the input stats, hash and organ set of a segmentation output
+MANIFEST_NAME = "manifest.json"
+# Read size used when hashing input scans
+HASH_CHUNK_SIZE = 1 << 20
+# File name of the combined label volume written in multilabel mode
+MULTILABEL_NAME = "segmentation.nii.gz"
+# Organ mask extensions; uncompressed .nii masks are memory-mapped by nibabel
+MASK_EXTENSIONS = ('.nii.gz', '.nii')
+# Scan extensions stripped from the input name when naming its output folder
+INPUT_EXTENSIONS = ('.nii.gz', '.nii', '.dcm')
+# Device TotalSegmentator runs on
+SEGMENTATION_DEVICE = "cpu"
+
+if njit is not None:
+    @njit(nogil=True, cache=True)
+    def _any_per_slice(data):
+        """
+        Fused compare+reduce over each z-plane, stopping at the first non-zero voxel
+        """
+        num_slices = data.shape[2]
+        out = np.zeros(num_slices, dtype=np.bool_)
+        for z in range(num_slices):
+            found = False
+            for y in range(data.shape[1]):
+                for x in range(data.shape[0]):
+                    if data[x, y, z] != 0:
+                        found = True
+                        break
+                if found:
+                    break
+            out[z] = found
+        return out
+else:
+    _any_per_slice = None
+
+def _mask_name(filename):
+    """
+    Returns the organ name of a mask file, or None if it isn't a NIfTI mask
+    """
+    for ext in MASK_EXTENSIONS:
+        if filename.endswith(ext):
+            return filename[:-len(ext)]
+    return None
+
+def _segmentation_worker(jobs, results):
+    """
+    Runs TotalSegmentator jobs from a queue in a long-lived process, so the
+    torch/nnU-Net import and setup cost is paid once instead of per scan
+    """
+    for kwargs in iter(jobs.get, None):
+        try:
+            totalsegmentator(**kwargs)
+            results.put(None)
+        except Exception as e:
+            results.put(f"{type(e).__name__}: {e}")
+
 class OrganSegmentator:
+    # Segmentation worker process shared by all instances (Main creates a new
+    # segmentator for every scan): (process, jobs queue, results queue)
+    _worker = None
+
     def __init__(self):
-        pass
+        # output_path -> {organ name: mask path}, filled by segment()
+        self._organ_index = {}
 
-    def segment(self, input_path, organs="liver", output_path="output"):
+    def segment(self, input_path, organs="liver", output_path="output", write_parquet=False, multilabel=False):
         """
         Segments organs and creates a CSV mapping slices to organs
+        With multilabel, TotalSegmentator writes one combined label volume instead of
+        a mask per organ (the viewer's outline mode needs the per-organ masks)
         """
-        patient_name = input_path.split(os.sep)[-1].split("/")[0]
+        # Scan name without folders or .nii/.nii.gz/.dcm extensions (normpath drops a
+        # trailing separator on DICOM folder inputs). Only those suffixes go: dotted
+        # folder names such as series UIDs must stay distinct
+        patient_name = os.path.basename(os.path.normpath(input_path))
+        for ext in INPUT_EXTENSIONS:
+            if patient_name.lower().endswith(ext):
+                patient_name = patient_name[:-len(ext)]
+                break
         output_path = patient_name + "_" + output_path
-        # Check if segmentation already exists
-        if os.path.exists(output_path) and os.listdir(output_path):
-            nifti_files = [f for f in os.listdir(output_path) if f.endswith('.nii.gz')]
-            if nifti_files:
-                print(f"Segmentation output already exists at {output_path}. Skipping segmentation.")
-            else:
-                # Directory exists but no segmentation files, run segmentation
-                self._run_segmentation(input_path, organs, output_path)
+        # Reuse an existing segmentation only if its manifest shows it was made
+        # from this exact input and organ set
+        organ_list = [organs] if isinstance(organs, str) else list(organs)
+        manifest = {"input_stats": self._input_stats(input_path), "organs": sorted(organ_list),
+                    "multilabel": multilabel}
+        nifti_files = []
+        if os.path.isdir(output_path):
+            nifti_files = [f for f in os.listdir(output_path) if _mask_name(f) is not None]
+        
+        if nifti_files and self._manifest_matches(output_path, manifest, input_path):
+            print(f"Segmentation output already exists at {output_path}. Skipping segmentation.")
         else:
-            # Directory doesn't exist or is empty, run segmentation
-            self._run_segmentation(input_path, organs, output_path)
+            # No output yet, or it belongs to a different input/organ set
+            self._run_segmentation(input_path, organs, output_path, multilabel)
+            manifest["input_sha256"] = self._input_digest(input_path)
+            self._write_manifest(output_path, manifest)
+        
+        # Remember which organ masks were produced, so lookups don't hit the filesystem
+        self._organ_index[output_path] = {
+            _mask_name(f): os.path.join(output_path, f)
+            for f in os.listdir(output_path) if _mask_name(f) is not None
+        }
         
         # Generate CSV mapping slices to organs, placeholder until we find a model that does this
         csv_path = os.path.join(output_path, "slice_organ_mapping.csv")
-        self.create_slice_organ_csv(output_path, csv_path)
+        if multilabel:
+            label_path = os.path.join(output_path, MULTILABEL_NAME)
+            self.create_slice_organ_csv_from_labels(label_path, csv_path, write_parquet=write_parquet)
+        else:
+            self.create_slice_organ_csv(output_path, csv_path, write_parquet=write_parquet)
         
         return csv_path, output_path
 
-    def _run_segmentation(self, input_path, organs, output_path):
+    def _manifest_matches(self, output_path, manifest, input_path):
+        """
+        Whether the saved manifest is for this input and organ set. Unchanged input stats
+        settle it; the input is hashed only when they differ (e.g. the scan was copied
+        over or touched), and a matching hash refreshes the saved stats
+        """
+        saved = self._read_manifest(output_path)
+        if (saved is None or saved.get("organs") != manifest["organs"]
+                or saved.get("multilabel") != manifest["multilabel"]):
+            return False
+        if saved.get("input_stats") == manifest["input_stats"]:
+            manifest["input_sha256"] = saved.get("input_sha256")
+            return True
+        manifest["input_sha256"] = self._input_digest(input_path)
+        if saved.get("input_sha256") != manifest["input_sha256"]:
+            return False
+        self._write_manifest(output_path, manifest)
+        return True
+
+    def _input_stats(self, input_path):
+        """
+        Returns [path, mtime_ns, size] of each input file (name order for a DICOM folder)
+        """
+        stats = []
+        for file_path in self._input_files(input_path):
+            st = os.stat(file_path)
+            stats.append([os.path.abspath(file_path), st.st_mtime_ns, st.st_size])
+        return stats
+
+    def _input_files(self, input_path):
+        """
+        Returns the files of the input scan (all files in name order for a DICOM folder)
+        """
+        if os.path.isdir(input_path):
+            files = sorted(os.path.join(input_path, f) for f in os.listdir(input_path))
+        else:
+            files = [input_path]
+        return [f for f in files if os.path.isfile(f)]
+
+    def _input_digest(self, input_path):
+        """
+        Returns the SHA-256 of the input scan (all files in name order for a DICOM folder)
+        """
+        sha = hashlib.sha256()
+        for file_path in self._input_files(input_path):
+            with open(file_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                    sha.update(chunk)
+        return sha.hexdigest()
+
+    def _read_manifest(self, output_path):
+        """
+        Returns the manifest saved with a previous segmentation, or None
+        """
+        try:
+            with open(os.path.join(output_path, MANIFEST_NAME)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_manifest(self, output_path, manifest):
+        """
+        Records which input and organs the segmentation in output_path came from
+        """
+        with open(os.path.join(output_path, MANIFEST_NAME), 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+    def _run_segmentation(self, input_path, organs, output_path, multilabel=False):
         """
         Runs the actual segmentation process
         """
-        totalsegmentator(
+        if multilabel:
+            # ml output is a single file, so the folder has to exist beforehand
+            os.makedirs(output_path, exist_ok=True)
+        num_cpus = os.cpu_count() or 1
+        kwargs = dict(
             input=input_path,
-            output=output_path,
+            output=os.path.join(output_path, MULTILABEL_NAME) if multilabel else output_path,
+            ml=multilabel,
             roi_subset = organs,
             task='total',  
             fast=True,
             body_seg=True,
             force_split=False,
-            nr_thr_saving=1,
-            device= "cpu"
+            nr_thr_resamp=num_cpus,
+            nr_thr_saving=max(2, num_cpus // 2),
+            device=SEGMENTATION_DEVICE
         )
+        
+        process, jobs, results = self._get_worker()
+        jobs.put(kwargs)
+        while True:
+            try:
+                error = results.get(timeout=1)
+                break
+            except queue.Empty:
+                if not process.is_alive():
+                    OrganSegmentator._worker = None
+                    raise RuntimeError("Segmentation worker exited unexpectedly")
+        if error is not None:
+            raise RuntimeError(f"Segmentation failed: {error}")
         print(f"Segmentation completed. Results saved to {output_path}")
 
-    def create_slice_organ_csv(self, output_path, csv_path):
+    @classmethod
+    def _get_worker(cls):
+        """
+        Returns the (process, jobs, results) of the segmentation worker, starting it if needed
+        """
+        if cls._worker is None or not cls._worker[0].is_alive():
+            # Not a daemon: TotalSegmentator starts its own pools for resampling/saving
+            ctx = multiprocessing.get_context("spawn")
+            jobs, results = ctx.Queue(), ctx.Queue()
+            process = ctx.Process(target=_segmentation_worker, args=(jobs, results))
+            process.start()
+            cls._worker = (process, jobs, results)
+            atexit.register(cls._stop_worker, process, jobs)
+        return cls._worker
+
+    @staticmethod
+    def _stop_worker(process, jobs):
+        """
+        Lets the worker leave its job loop so the interpreter can exit, terminating
+        it if it's still busy with a segmentation after the grace period
+        """
+        if process.is_alive():
+            jobs.put(None)
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+
+    def create_slice_organ_csv(self, output_path, csv_path, write_csv=True, write_parquet=False):
         """
         Creates a CSV file mapping each slice to the organs present in it
         Memory-efficient version: loads one organ at a time
+        With write_parquet, also writes the mapping next to it as a .parquet table
         """
-        # Get all organ segmentation files
-        organ_files = [f for f in os.listdir(output_path) if f.endswith('.nii.gz')]
+        # Get all organ segmentation files (name, path, size) in one directory pass,
+        # smallest first so cheap masks finish early and keep the thread pool fed
+        with os.scandir(output_path) as entries:
+            organ_entries = [(_mask_name(e.name), e.path, e.stat().st_size)
+                             for e in entries if _mask_name(e.name) is not None]
+        organ_entries.sort(key=lambda entry: entry[2])
         
-        if not organ_files:
+        if not organ_entries:
             print("No segmentation files found.")
             return
         
         # First pass: determine number of slices from first valid file
         num_slices = None
-        for organ_file in organ_files:
-            file_path = os.path.join(output_path, organ_file)
+        for organ_name, file_path, _ in organ_entries:
             try:
                 nii = nib.load(file_path)
-                data = nii.get_fdata()
-                num_slices = data.shape[2]
-                del nii, data  # Free memory
+                # Shape comes from the header, no need to read voxels
+                num_slices = nii.shape[2]
+                del nii
                 break
             except Exception as e:
-                print(f"Error loading {organ_file}: {e}")
+                print(f"Error loading {os.path.basename(file_path)}: {e}")
                 continue
         
         if num_slices is None:
             print("No valid organ data loaded.")
             return
         
-        # Initialize slice-to-organs mapping
-        slice_organs = {i: [] for i in range(num_slices)}
+        # Organ-by-slice presence matrix: row i holds the slices organ i appears in
+        organ_names = [name for name, _, _ in organ_entries]
+        present = np.zeros((len(organ_entries), num_slices), dtype=bool)
         
-        # Second pass: process each organ file one at a time
-        for organ_file in organ_files:
-            organ_name = organ_file.replace('.nii.gz', '')
-            file_path = os.path.join(output_path, organ_file)
-            
-            try:
-                print(f"Processing {organ_name}...")
-                nii = nib.load(file_path)
-                data = nii.get_fdata()
-                
-                # Check each slice for this organ
-                for slice_idx in range(num_slices):
-                    if np.any(data[:, :, slice_idx] > 0):
-                        slice_organs[slice_idx].append(organ_name)
-                
-                # Explicitly free memory
-                del nii, data
-                
-            except Exception as e:
-                print(f"Error processing {organ_file}: {e}")
+        # Second pass: organ files are independent, so reduce them concurrently
+        # (gzip inflation and the NumPy reduction both release the GIL)
+        with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(organ_entries))) as executor:
+            futures = {
+                executor.submit(self._organ_slice_presence, organ_name, file_path, num_slices): i
+                for i, (organ_name, file_path, _) in enumerate(organ_entries)
+            }
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    present[i] = future.result()
+                except Exception as e:
+                    print(f"Error processing {os.path.basename(organ_entries[i][1])}: {e}")
+        
+        self._write_slice_organ_mapping(csv_path, organ_names, present, write_csv, write_parquet)
+
+    def create_slice_organ_csv_from_labels(self, label_path, csv_path, label_names=None,
+                                           write_csv=True, write_parquet=False):
+        """
+        Creates the slice/organ CSV from a single combined label volume
+        One pass over the voxels instead of one pass per organ mask
+        label_names maps label id -> organ name (TotalSegmentator's 'total' map by default)
+        """
+        if label_names is None:
+            from totalsegmentator.map_to_binary import class_map
+            label_names = class_map['total']
+        
+        try:
+            # keep_file_open stops nibabel from re-opening (and re-inflating) the .gz per slab
+            nii = nib.load(label_path, keep_file_open=True)
+        except Exception as e:
+            print(f"Error loading {label_path}: {e}")
+            return
+        proxy = nii.dataobj
+        num_slices = proxy.shape[2]
+        
+        # Presence row per label id; only labels that occur somewhere get one
+        label_rows = {}
+        for z0, z1, slab in self._iter_slabs(proxy, num_slices):
+            if not slab.any():
                 continue
+            for j in range(z1 - z0):
+                for label in self._labels_in_plane(slab[..., j]):
+                    label = int(label)
+                    if label != 0 and label in label_names:
+                        label_rows.setdefault(label, np.zeros(num_slices, dtype=bool))[z0 + j] = True
+        
+        label_ids = sorted(label_rows)
+        organ_names = [label_names[label] for label in label_ids]
+        present = np.zeros((len(label_ids), num_slices), dtype=bool)
+        for i, label in enumerate(label_ids):
+            present[i] = label_rows[label]
+        self._write_slice_organ_mapping(csv_path, organ_names, present, write_csv, write_parquet)
+
+    def _iter_slabs(self, proxy, num_slices):
+        """
+        Yields (z0, z1, slab) over the volume, reading the next slab on a helper
+        thread while the caller reduces the current one
+        """
+        def read(z0):
+            return np.asanyarray(proxy[..., z0:min(z0 + SLAB_DEPTH, num_slices)])
         
-        # Write CSV
-        with open(csv_path, 'w', newline='') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(['Slice_Index', 'Organs_Present'])
+        with ThreadPoolExecutor(max_workers=1) as reader:
+            pending = reader.submit(read, 0) if num_slices > 0 else None
+            for z0 in range(0, num_slices, SLAB_DEPTH):
+                slab = pending.result()
+                if z0 + SLAB_DEPTH < num_slices:
+                    pending = reader.submit(read, z0 + SLAB_DEPTH)
+                yield z0, min(z0 + SLAB_DEPTH, num_slices), slab
+
+    def _labels_in_plane(self, plane):
+        """
+        Returns the label ids occurring in a 2D label plane
+        """
+        if plane.dtype.kind in 'ui' and plane.dtype.itemsize <= 4 and plane.min() >= 0:
+            # Histogram instead of np.unique: one linear pass, no sort
+            return np.flatnonzero(np.bincount(plane.ravel(order='K')))
+        return np.unique(plane)
+
+    def _write_slice_organ_mapping(self, csv_path, organ_names, present, write_csv, write_parquet):
+        """
+        Writes the (num_organs, num_slices) presence matrix as CSV and/or Parquet
+        """
+        num_slices = present.shape[1]
+        if write_csv:
+            # Build all rows first, then write them in one batch through a large buffer
+            # (organ names are picked per slice by masking an object array with the column)
+            names = np.array(organ_names, dtype=object)
+            rows = []
+            for slice_idx, col in enumerate(present.T):
+                organs_str = '; '.join(names[col].tolist()) if col.any() else 'None'
+                rows.append([slice_idx, organs_str])
             
-            for slice_idx in range(num_slices):
-                organs_str = '; '.join(slice_organs[slice_idx]) if slice_organs[slice_idx] else 'None'
-                writer.writerow([slice_idx, organs_str])
+            # Write CSV
+            with open(csv_path, 'w', newline='', buffering=CSV_BUFFER_SIZE) as csvfile:
+                writer = csv.writer(csvfile)
+                writer.writerow(['Slice_Index', 'Organs_Present'])
+                writer.writerows(rows)
+            
+            print(f"CSV file created at: {csv_path}")
+        
+        if write_parquet:
+            self._write_parquet(os.path.splitext(csv_path)[0] + ".parquet", organ_names, present)
         
-        print(f"CSV file created at: {csv_path}")
         print(f"Total slices processed: {num_slices}")
 
+    def _write_parquet(self, parquet_path, organ_names, present):
+        """
+        Writes the slice/organ mapping as a Parquet table with one bool column per organ
+        """
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            print("pyarrow is not installed, skipping Parquet output.")
+            return
+        
+        columns = {'Slice_Index': np.arange(present.shape[1])}
+        columns.update({name: present[i] for i, name in enumerate(organ_names)})
+        pq.write_table(pa.table(columns), parquet_path, compression='zstd')
+        print(f"Parquet file created at: {parquet_path}")
+
+    def _organ_slice_presence(self, organ_name, file_path, num_slices):
+        """
+        Returns a bool vector marking the slices where the organ mask is non-zero
+        """
+        print(f"Processing {organ_name}...")
+        # keep_file_open stops nibabel from re-opening (and re-inflating) the .gz per slab;
+        # with indexed_gzip installed it can also seek straight to a slab. Uncompressed
+        # .nii masks are memory-mapped, so a slab is read straight from the page cache
+        nii = nib.load(file_path, mmap=True, keep_file_open=True)
+        proxy = nii.dataobj
+        row = np.zeros(num_slices, dtype=bool)
+        
+        # Stream a slab of z-planes at a time in its native dtype (z is the
+        # slowest axis on disk) and reduce the whole slab with one any()
+        for z0, z1, slab in self._iter_slabs(proxy, num_slices):
+            # Most slabs of an organ mask are empty: one flat pass over the
+            # buffer settles them without the per-plane reduction
+            if not slab.any():
+                continue
+            if _any_per_slice is not None:
+                row[z0:z1] = _any_per_slice(slab)
+            else:
+                # any() already tests for non-zero in every dtype, no bool temporary needed
+                row[z0:z1] = slab.any(axis=(0, 1))
+        
+        return row
+
     def return_selected_organ(self, output_path, organ_name):
         """
         Returns the segmented organ file path
         """
-        organ_file = os.path.join(output_path, f"{organ_name}.nii.gz")
-        if os.path.exists(organ_file):
+        index = self._organ_index.get(output_path)
+        if index is not None:
+            organ_file = index.get(organ_name)
+        else:
+            # Folder wasn't produced by segment() on this instance, check the disk
+            organ_file = None
+            for ext in MASK_EXTENSIONS:
+                candidate = os.path.join(output_path, organ_name + ext)
+                if os.path.exists(candidate):
+                    organ_file = candidate
+                    break
+        
+        if organ_file is not None:
             print(f"Segmented organ file located at: {organ_file}")
             return organ_file
         else:
@@ -2,21 +2,240 @@
 
 from PySide6.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, 
-    QListWidget, QLabel, QFileDialog, 
-    QGroupBox, QMessageBox, QFrame, QScrollArea
+    QListWidget, QListView, QLabel, QFileDialog, 
+    QGroupBox, QMessageBox, QFrame, QTextBrowser
 )
-from PySide6.QtCore import Signal, Qt
+from PySide6.QtCore import Signal, Qt, QObject, QRunnable, QThreadPool, QTimer, QFileSystemWatcher
 from PySide6.QtGui import QFont
 from pathlib import Path
+from string import Template
+import bisect
+import functools
+import importlib
+import math
+import numpy as np
+import os
+import sqlite3
 import sys
 
-class ScrollLabel(QLabel):
-    """A QLabel with automatic scrolling for long content"""
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.setWordWrap(True)
-        self.setTextFormat(Qt.TextFormat.RichText)
-        self.setAlignment(Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignTop)
+# Pieces the sampled voxels are split into for the early-exit statistics scan
+SAMPLE_SCAN_CHUNKS = 16
+# Segmentation results kept across sessions, keyed by path + mtime + size
+SEG_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "multi-planar-viewer", "seg_cache.sqlite")
+# The only DICOM header elements the panel reads, so pydicom can skip the rest
+DICOM_INFO_TAGS = ['PatientName', 'Modality', 'StudyDate', 'Rows', 'Columns', 'SOPClassUID']
+# Delay before a selection is analyzed, so arrow-key scrolling doesn't queue a check per row
+SELECT_DEBOUNCE_MS = 150
+
+@functools.lru_cache(maxsize=None)
+def optional_module(name):
+    """
+    Optional reader or JIT (nibabel, pydicom, numba) imported on first use and kept,
+    so the panels open without waiting for them. None if it isn't installed
+    """
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
+def _seg_probe(data):
+    """
+    Fused min/max/integer test over the sample, stopping at the first voxel
+    that rules out a label map (max > 100 or a non-integer value)
+    """
+    mn = data[0]
+    mx = data[0]
+    ints = True
+    for i in range(data.size):
+        v = data[i]
+        if v < mn:
+            mn = v
+        if v > mx:
+            mx = v
+        if mx > 100:
+            break
+        f = float(v)
+        # NaN/inf, or further from the nearest integer than np.allclose allows
+        if f - f != 0:
+            ints = False
+            break
+        r = math.floor(f + 0.5)
+        if abs(f - r) > 1e-8 + 1e-5 * abs(r):
+            ints = False
+            break
+    return mn, mx, ints
+
+@functools.lru_cache(maxsize=None)
+def _jit_seg_probe():
+    """_seg_probe compiled by numba on first use, None without numba"""
+    numba = optional_module("numba")
+    return numba.njit(cache=True, boundscheck=False)(_seg_probe) if numba is not None else None
+
+# Dark theme for the panel, built once at import instead of per instance
+_STYLESHEET = """
+    QWidget {
+        background-color: #2b2b2b;
+        color: #e0e0e0;
+        font-family: 'Segoe UI', Arial, sans-serif;
+        font-size: 10pt;
+    }
+    
+    QPushButton {
+        background-color: #3d5a80;
+        color: white;
+        border: none;
+        border-radius: 6px;
+        padding: 8px 12px;
+        font-weight: bold;
+    }
+    
+    QPushButton:hover {
+        background-color: #4a6fa5;
+    }
+    
+    QPushButton:pressed {
+        background-color: #2c4460;
+    }
+    
+    QPushButton:disabled {
+        background-color: #404040;
+        color: #808080;
+    }
+    
+    QPushButton#load_button {
+        background-color: #2a9d8f;
+        font-size: 11pt;
+    }
+    
+    QPushButton#load_button:hover {
+        background-color: #35c4b4;
+    }
+    
+    QListWidget {
+        background-color: #1e1e1e;
+        border: 2px solid #3d5a80;
+        border-radius: 6px;
+        padding: 6px;
+        color: #e0e0e0;
+        font-size: 10pt;
+    }
+    
+    QListWidget::item {
+        padding: 8px;
+        border-radius: 4px;
+    }
+    
+    QListWidget::item:selected {
+        background-color: #3d5a80;
+        color: white;
+    }
+    
+    QListWidget::item:hover {
+        background-color: #2d4560;
+    }
+    
+    QLabel {
+        color: #e0e0e0;
+    }
+    
+    QGroupBox {
+        border: 2px solid #3d5a80;
+        border-radius: 8px;
+        margin-top: 8px;
+        padding-top: 12px;
+        font-weight: bold;
+        background-color: #1e1e1e;
+    }
+    
+    QGroupBox::title {
+        subcontrol-origin: margin;
+        left: 12px;
+        padding: 0 6px;
+        color: #98c1d9;
+    }
+    
+    QFrame {
+        background-color: #1e1e1e;
+        border: 1px solid #3d5a80;
+        border-radius: 6px;
+        padding: 8px;
+    }
+    
+    QTextBrowser {
+        border: 1px solid #3d5a80;
+        border-radius: 6px;
+        background-color: #1a1a1a;
+        padding: 12px;
+    }
+    
+    QScrollBar:vertical {
+        background-color: #2b2b2b;
+        width: 15px;
+        border-radius: 7px;
+    }
+    
+    QScrollBar::handle:vertical {
+        background-color: #3d5a80;
+        border-radius: 7px;
+        min-height: 20px;
+    }
+    
+    QScrollBar::handle:vertical:hover {
+        background-color: #4a6fa5;
+    }
+    
+    QScrollBar::add-line:vertical, QScrollBar::sub-line:vertical {
+        border: none;
+        background: none;
+    }
+"""
+
+# File info panel HTML: one shared frame, the per-format details are filled in
+_INFO_TPL = Template(
+    '<div style="line-height: 1.6; font-size: 10pt;">'
+    '<h3 style="color: $title_color; margin-top: 0; margin-bottom: 12px;">File Details</h3>'
+    '<p><b>Filename:</b> $filename</p>$status$details</div>'
+)
+_STATUS_TPL = Template(
+    '<div style="background-color: ${color}33; border-left: 4px solid $color; padding: 8px; '
+    'margin: 10px 0; border-radius: 4px;"><b style="color: $color;">🏷️ Status:</b> $status</div>'
+)
+_INSTALL_HINT = Template(
+    '<p><i>For detailed $kind information, install $package:</i><br>'
+    '<code style="background: #2b2b2b; padding: 4px; border-radius: 3px;">pip install $package</code></p>'
+)
+
+class InfoBrowser(QTextBrowser):
+    """A read-only scrolling rich-text view that only re-parses HTML when it changes"""
+    def __init__(self, text="", parent=None):
+        super().__init__(parent)
+        self.setOpenExternalLinks(False)
+        self.setReadOnly(True)
+        self._html = None
+        self.setText(text)
+    
+    def setText(self, html):
+        # Re-selecting the same file renders identical HTML, keep the laid-out document
+        if html == self._html:
+            return
+        self._html = html
+        self.document().setHtml(html)
+
+class SegCheckSignals(QObject):
+    """Carries SegCheckJob results back to the UI thread: (filepath, cache key, is_segmented)"""
+    finished = Signal(str, object, bool)
+
+class SegCheckJob(QRunnable):
+    """Runs a segmentation check on the thread pool"""
+    def __init__(self, filepath, key, check, signals):
+        super().__init__()
+        self.filepath = filepath
+        self.key = key
+        self.check = check
+        self.signals = signals
+    
+    def run(self):
+        self.signals.finished.emit(self.filepath, self.key, bool(self.check(self.filepath)))
 
 class InspectorPanel(QWidget):
     """
@@ -28,11 +247,35 @@ class InspectorPanel(QWidget):
     # Signal emitted when file is loaded: (filepath, has_segmentation)
     file_selected = Signal(str, bool)
     
+    # Fonts shared by every panel instead of being resolved per widget
+    TITLE_FONT = QFont("Arial", 14, QFont.Weight.Bold)
+    GROUP_FONT = QFont("Arial", 10, QFont.Weight.Bold)
+    SECTION_FONT = QFont("Arial", 11, QFont.Weight.Bold)
+    
     def __init__(self, main):
         super().__init__()
         self.current_directory = None
         self.available_files = []
         self.main = main
+        # (path, mtime_ns, size) -> segmentation flag / info HTML, so re-selecting
+        # a file doesn't re-open and re-sample it
+        self._seg_cache = {}
+        self._info_cache = {}
+        # (filepath, is_segmented) of the last file whose status was shown or loaded
+        self._current_seg = None
+        # On-disk copy of _seg_cache, opened on first use (False if it can't be opened)
+        self._seg_db = None
+        # Segmentation checks run off the UI thread; keys of the ones in flight
+        self._seg_jobs = set()
+        self._seg_signals = SegCheckSignals(self)
+        self._seg_signals.finished.connect(self._on_seg_check_done)
+        self._select_timer = QTimer(self)
+        self._select_timer.setSingleShot(True)
+        self._select_timer.setInterval(SELECT_DEBOUNCE_MS)
+        self._select_timer.timeout.connect(self._show_selected_file_info)
+        # Keeps the file list in sync with files added/removed outside the app
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self._on_directory_changed)
         self.setup_ui()
         self.apply_styles()
     
@@ -44,14 +287,14 @@ class InspectorPanel(QWidget):
         
         # ===== TITLE =====
         title = QLabel("Medical File Inspector - NIfTI + DICOM")
-        title.setFont(QFont("Arial", 14, QFont.Weight.Bold))
+        title.setFont(self.TITLE_FONT)
         title.setAlignment(Qt.AlignmentFlag.AlignCenter)
         title.setMaximumHeight(30)
         main_layout.addWidget(title)
         
         # ===== BROWSE SECTION =====
         browse_group = QGroupBox("Browse Directory")
-        browse_group.setFont(QFont("Arial", 10, QFont.Weight.Bold))
+        browse_group.setFont(self.GROUP_FONT)
         browse_layout = QVBoxLayout(browse_group)
         
         self.btn_browse = QPushButton("Browse Directory")
@@ -80,11 +323,16 @@ class InspectorPanel(QWidget):
         left_layout = QVBoxLayout(left_container)
         
         file_list_title = QLabel("Medical Files")
-        file_list_title.setFont(QFont("Arial", 11, QFont.Weight.Bold))
+        file_list_title.setFont(self.SECTION_FONT)
         left_layout.addWidget(file_list_title)
         
         self.file_list = QListWidget()
         self.file_list.setMinimumHeight(300)
+        # All rows are one line of text: skip per-item size measurement and lay
+        # out big folders in batches so the list shows up immediately
+        self.file_list.setUniformItemSizes(True)
+        self.file_list.setLayoutMode(QListView.LayoutMode.Batched)
+        self.file_list.setBatchSize(100)
         self.file_list.itemDoubleClicked.connect(self.on_file_double_clicked)
         self.file_list.currentRowChanged.connect(self.on_file_selected)
         left_layout.addWidget(self.file_list)
@@ -97,22 +345,17 @@ class InspectorPanel(QWidget):
         right_layout = QVBoxLayout(right_container)
         
         info_title = QLabel("File Information")
-        info_title.setFont(QFont("Arial", 11, QFont.Weight.Bold))
+        info_title.setFont(self.SECTION_FONT)
         right_layout.addWidget(info_title)
         
         # Create scrollable info area
-        info_scroll = QScrollArea()
-        info_scroll.setWidgetResizable(True)
-        info_scroll.setMinimumHeight(280)
-        info_scroll.setMaximumHeight(350)
-        info_scroll.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAsNeeded)
-        info_scroll.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAsNeeded)
+        self.info_label = InfoBrowser("Select a file to see details")
+        self.info_label.setMinimumHeight(280)
+        self.info_label.setMaximumHeight(350)
+        self.info_label.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAsNeeded)
+        self.info_label.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAsNeeded)
         
-        self.info_label = ScrollLabel("Select a file to see details")
-        self.info_label.setStyleSheet("background-color: #1a1a1a; padding: 12px; border-radius: 4px;")
-        info_scroll.setWidget(self.info_label)
-        
-        right_layout.addWidget(info_scroll)
+        right_layout.addWidget(self.info_label)
         
         content_layout.addWidget(right_container, stretch=1)
         
@@ -131,122 +374,7 @@ class InspectorPanel(QWidget):
     
     def apply_styles(self):
         """Apply modern dark theme styling"""
-        self.setStyleSheet("""
-            QWidget {
-                background-color: #2b2b2b;
-                color: #e0e0e0;
-                font-family: 'Segoe UI', Arial, sans-serif;
-                font-size: 10pt;
-            }
-            
-            QPushButton {
-                background-color: #3d5a80;
-                color: white;
-                border: none;
-                border-radius: 6px;
-                padding: 8px 12px;
-                font-weight: bold;
-            }
-            
-            QPushButton:hover {
-                background-color: #4a6fa5;
-            }
-            
-            QPushButton:pressed {
-                background-color: #2c4460;
-            }
-            
-            QPushButton:disabled {
-                background-color: #404040;
-                color: #808080;
-            }
-            
-            QPushButton#load_button {
-                background-color: #2a9d8f;
-                font-size: 11pt;
-            }
-            
-            QPushButton#load_button:hover {
-                background-color: #35c4b4;
-            }
-            
-            QListWidget {
-                background-color: #1e1e1e;
-                border: 2px solid #3d5a80;
-                border-radius: 6px;
-                padding: 6px;
-                color: #e0e0e0;
-                font-size: 10pt;
-            }
-            
-            QListWidget::item {
-                padding: 8px;
-                border-radius: 4px;
-            }
-            
-            QListWidget::item:selected {
-                background-color: #3d5a80;
-                color: white;
-            }
-            
-            QListWidget::item:hover {
-                background-color: #2d4560;
-            }
-            
-            QLabel {
-                color: #e0e0e0;
-            }
-            
-            QGroupBox {
-                border: 2px solid #3d5a80;
-                border-radius: 8px;
-                margin-top: 8px;
-                padding-top: 12px;
-                font-weight: bold;
-                background-color: #1e1e1e;
-            }
-            
-            QGroupBox::title {
-                subcontrol-origin: margin;
-                left: 12px;
-                padding: 0 6px;
-                color: #98c1d9;
-            }
-            
-            QFrame {
-                background-color: #1e1e1e;
-                border: 1px solid #3d5a80;
-                border-radius: 6px;
-                padding: 8px;
-            }
-            
-            QScrollArea {
-                border: 1px solid #3d5a80;
-                border-radius: 6px;
-                background-color: #1a1a1a;
-            }
-            
-            QScrollBar:vertical {
-                background-color: #2b2b2b;
-                width: 15px;
-                border-radius: 7px;
-            }
-            
-            QScrollBar::handle:vertical {
-                background-color: #3d5a80;
-                border-radius: 7px;
-                min-height: 20px;
-            }
-            
-            QScrollBar::handle:vertical:hover {
-                background-color: #4a6fa5;
-            }
-            
-            QScrollBar::add-line:vertical, QScrollBar::sub-line:vertical {
-                border: none;
-                background: none;
-            }
-        """)
+        self.setStyleSheet(_STYLESHEET)
     
     # ========== CORE FUNCTIONALITY ==========
     
@@ -261,6 +389,9 @@ class InspectorPanel(QWidget):
         if folder:
             self.current_directory = folder
             self.update_directory_display(folder)
+            if self.watcher.directories():
+                self.watcher.removePaths(self.watcher.directories())
+            self.watcher.addPath(folder)
             self.scan_directory()
     
     def scan_directory(self):
@@ -272,20 +403,15 @@ class InspectorPanel(QWidget):
         self.file_list.clear()
         
         try:
-            directory = Path(self.current_directory)
-            
-            # Find NIfTI files (.nii and .nii.gz)
-            nifti_files = list(directory.glob("*.nii")) + list(directory.glob("*.nii.gz"))
-            # Find DICOM files (.dcm)
-            dicom_files = list(directory.glob("*.dcm"))
-            
-            # Combine and sort
-            all_files = sorted(nifti_files + dicom_files)
+            all_files = self._list_medical_files(self.current_directory)
             
-            # Store all files
-            for file in all_files:
-                self.available_files.append(str(file))
-                self.file_list.addItem(f"{file.name}")
+            # Store all files, inserting the rows in one batch without repaints
+            self.available_files = all_files
+            self.file_list.setUpdatesEnabled(False)
+            self.file_list.blockSignals(True)
+            self.file_list.addItems([os.path.basename(file) for file in all_files])
+            self.file_list.blockSignals(False)
+            self.file_list.setUpdatesEnabled(True)
             
             # Update UI with correct count
             total_count = len(self.available_files)
@@ -310,13 +436,81 @@ class InspectorPanel(QWidget):
                 f"Could not scan directory:\n{str(e)}"
             )
     
+    def _list_medical_files(self, directory):
+        """Sorted paths of the NIfTI (.nii, .nii.gz) and DICOM (.dcm) files in a directory, one pass"""
+        all_files = []
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(('.nii', '.nii.gz', '.dcm')) and entry.is_file():
+                    all_files.append(entry.path)
+        all_files.sort()
+        return all_files
+    
+    def _on_directory_changed(self, directory):
+        """Insert/remove only the rows for files that appeared or vanished"""
+        if directory != self.current_directory:
+            return
+        try:
+            current_files = self._list_medical_files(directory)
+        except OSError as e:
+            print(f"⚠️ Error rescanning directory: {e}")
+            return
+        
+        # Going from or to an empty folder swaps the placeholder row, do a full rescan
+        if not self.available_files or not current_files:
+            self.scan_directory()
+            return
+        
+        current_set = set(current_files)
+        known_set = set(self.available_files)
+        if current_set == known_set:
+            return
+        
+        selected = self.selected_filepath
+        self.file_list.blockSignals(True)
+        for row in range(len(self.available_files) - 1, -1, -1):
+            if self.available_files[row] not in current_set:
+                self.file_list.takeItem(row)
+                del self.available_files[row]
+        for file in current_files:
+            if file not in known_set:
+                row = bisect.bisect_left(self.available_files, file)
+                self.available_files.insert(row, file)
+                self.file_list.insertItem(row, os.path.basename(file))
+        self.file_list.blockSignals(False)
+        
+        # The current item follows inserts, only a removed selection needs a refresh
+        if selected not in current_set:
+            self.on_file_selected(self.file_list.currentRow())
+    
     def on_file_selected(self, row):
         """Handle file selection (single click)"""
         if row < 0 or row >= len(self.available_files):
             return
         
-        filepath = self.available_files[row]
-        self.show_file_info(filepath)
+        # (Re)start the debounce, only the row the user settles on gets analyzed
+        self._select_timer.start()
+    
+    def _show_selected_file_info(self):
+        """Show info for the current row once the selection has settled"""
+        filepath = self.selected_filepath
+        if filepath:
+            self.show_file_info(filepath)
+    
+    def _start_seg_check(self, filepath, key):
+        """Queue a background segmentation check unless one is already running"""
+        if key in self._seg_jobs:
+            return
+        self._seg_jobs.add(key)
+        job = SegCheckJob(filepath, key, self._detect_segmentation, self._seg_signals)
+        QThreadPool.globalInstance().start(job)
+    
+    def _on_seg_check_done(self, filepath, key, is_segmentation):
+        """Store a finished check and refresh the panel if that file is still selected"""
+        self._seg_jobs.discard(key)
+        self._store_seg(key, is_segmentation)
+        if self.selected_filepath == filepath:
+            self.show_file_info(filepath)
     
     def on_file_double_clicked(self, item):
         """Handle double-click on file"""
@@ -326,86 +520,66 @@ class InspectorPanel(QWidget):
         """Display file metadata with scrollable detailed information"""
         try:
             path = Path(filepath)
-            file_size_mb = path.stat().st_size / (1024 * 1024)
-            
-            # Auto-detect segmentation status (lightweight check - only reads sample of data)
-            has_segmentation = self.check_if_file_is_segmented(str(path))
-            
-            # Set status based on detection
-            segmentation_status = "Already Segmented" if has_segmentation else "🤖 AI Segmentation Needed"
-            segmentation_color = "#2a9d8f" if has_segmentation else "#f4a261"
+            key = self._file_key(filepath)
+            cached_info = self._info_cache.get(key)
+            if cached_info is not None:
+                self._current_seg = (filepath, self._seg_cache[key])
+                self.info_label.setText(cached_info)
+                return
+            file_size_mb = key[2] / (1024 * 1024)
+            
+            # Auto-detect segmentation status. This reads voxel data, so unless it's
+            # cached it runs on the thread pool and the panel shows it as pending
+            has_segmentation = self._cached_seg(key)
+            if has_segmentation is None:
+                self._start_seg_check(filepath, key)
+                segmentation_status = "⏳ Analyzing..."
+                segmentation_color = "#98c1d9"
+            else:
+                self._current_seg = (filepath, has_segmentation)
+                # Set status based on detection
+                segmentation_status = "Already Segmented" if has_segmentation else "🤖 AI Segmentation Needed"
+                segmentation_color = "#2a9d8f" if has_segmentation else "#f4a261"
             
             # Check file extension to determine type
             ext = path.suffix.lower()
+            nib, pydicom = optional_module("nibabel"), optional_module("pydicom")
+            size_html = f"<b>File Size:</b> {file_size_mb:.2f} MB"
+            title_color = "#98c1d9"
+            status_html = _STATUS_TPL.substitute(color=segmentation_color, status=segmentation_status)
+            
+            if ext == ".dcm" and pydicom is None:
+                details = f"<p><b>Format:</b> DICOM<br>{size_html}</p>" + _INSTALL_HINT.substitute(
+                    kind="DICOM", package="pydicom")
             
-            if ext == ".dcm":
+            elif ext == ".dcm":
                 # DICOM file handling
                 try:
-                    import pydicom
-                    ds = pydicom.dcmread(str(path), stop_before_pixels=True)
+                    ds = pydicom.dcmread(str(path), stop_before_pixels=True, specific_tags=DICOM_INFO_TAGS)
                     patient = str(getattr(ds, "PatientName", "Unknown"))
                     modality = str(getattr(ds, "Modality", "N/A"))
                     study_date = str(getattr(ds, "StudyDate", "N/A"))
                     rows = getattr(ds, "Rows", "?")
                     cols = getattr(ds, "Columns", "?")
                     
-                    info = f"""
-                    <div style="line-height: 1.6; font-size: 10pt;">
-                    <h3 style="color: #98c1d9; margin-top: 0; margin-bottom: 12px;">File Details</h3>
-                    
-                    <p><b>Filename:</b> {path.name}</p>
-                    
-                    <div style="background-color: {segmentation_color}33; border-left: 4px solid {segmentation_color}; padding: 8px; margin: 10px 0; border-radius: 4px;">
-                        <b style="color: {segmentation_color};">🏷️ Status:</b> {segmentation_status}
-                    </div>
-                    
-                    <p><b>Format:</b> DICOM<br>
-                    <b>Patient:</b> {patient}<br>
-                    <b>Modality:</b> {modality}<br>
-                    <b>Study Date:</b> {study_date}<br>
-                    <b>Dimensions:</b> {rows} × {cols} (single slice)<br>
-                    <b>File Size:</b> {file_size_mb:.2f} MB</p>
-                    
-                    <p><b>🔧 Technical Info:</b><br>
-                    • Header Verified: Yes<br>
-                    • Format: DICOM Standard</p>
-                    </div>
-                    """
-                except ImportError:
-                    info = f"""
-                    <div style="line-height: 1.6; font-size: 10pt;">
-                    <h3 style="color: #98c1d9; margin-top: 0; margin-bottom: 12px;">File Details</h3>
-                    
-                    <p><b>Filename:</b> {path.name}</p>
-                    
-                    <div style="background-color: {segmentation_color}33; border-left: 4px solid {segmentation_color}; padding: 8px; margin: 10px 0; border-radius: 4px;">
-                        <b style="color: {segmentation_color};">🏷️ Status:</b> {segmentation_status}
-                    </div>
-                    
-                    <p><b>Format:</b> DICOM<br>
-                    <b>File Size:</b> {file_size_mb:.2f} MB</p>
-                    
-                    <p><i>For detailed DICOM information, install pydicom:</i><br>
-                    <code style="background: #2b2b2b; padding: 4px; border-radius: 3px;">pip install pydicom</code></p>
-                    </div>
-                    """
+                    details = (
+                        f"<p><b>Format:</b> DICOM<br><b>Patient:</b> {patient}<br>"
+                        f"<b>Modality:</b> {modality}<br><b>Study Date:</b> {study_date}<br>"
+                        f"<b>Dimensions:</b> {rows} × {cols} (single slice)<br>{size_html}</p>"
+                        "<p><b>🔧 Technical Info:</b><br>• Header Verified: Yes<br>• Format: DICOM Standard</p>"
+                    )
                 except Exception as e:
-                    info = f"""
-                    <div style="line-height: 1.6; font-size: 10pt;">
-                    <h3 style="color: #e76f51; margin-top: 0; margin-bottom: 12px;">File Details</h3>
-                    
-                    <p><b>Filename:</b> {path.name}<br>
-                    <b>File Size:</b> {file_size_mb:.2f} MB</p>
-                    
-                    <p style='color: #e76f51;'>⚠️ Error reading DICOM header<br>
-                    {str(e)}</p>
-                    </div>
-                    """
+                    title_color = "#e76f51"
+                    status_html = ""
+                    details = f"<p>{size_html}</p><p style='color: #e76f51;'>⚠️ Error reading DICOM header<br>{e}</p>"
+            
+            elif ext in [".nii", ".gz"] and nib is None:
+                details = f"<p><b>Format:</b> NIfTI<br>{size_html}</p>" + _INSTALL_HINT.substitute(
+                    kind="NIfTI", package="nibabel")
             
             elif ext in [".nii", ".gz"]:
                 # NIfTI file handling
                 try:
-                    import nibabel as nib
                     img = nib.load(str(path))
                     shape = img.shape
                     spacing = img.header.get_zooms()
@@ -431,75 +605,29 @@ class InspectorPanel(QWidget):
                     for dim in shape[:3]:
                         voxel_count *= dim
                     
-                    info = f"""
-                    <div style="line-height: 1.6; font-size: 10pt;">
-                    <h3 style="color: #98c1d9; margin-top: 0; margin-bottom: 12px;">File Details</h3>
-                    
-                    <p><b>Filename:</b> {path.name}</p>
-                    
-                    <div style="background-color: {segmentation_color}33; border-left: 4px solid {segmentation_color}; padding: 8px; margin: 10px 0; border-radius: 4px;">
-                        <b style="color: {segmentation_color};">🏷️ Status:</b> {segmentation_status}
-                    </div>
-                    
-                    <p><b>Format:</b> NIfTI<br>
-                    <b>Dimensions:</b> {dim_info}<br>
-                    <b>Voxel Spacing:</b> {spacing_info}<br>
-                    <b>Data Type:</b> {datatype}</p>
-                    
-                    <p><b>Statistics:</b><br>
-                    • Voxel Count: {voxel_count:,}<br>
-                    • File Size: {file_size_mb:.2f} MB</p>
-                    
-                    <p><b>Technical Info:</b><br>
-                    • Affine Matrix: {'Yes' if affine is not None else 'No'}<br>
-                    • Header: Valid<br>
-                    • Integrity: ✓ Good</p>
-                    </div>
-                    """
-                except ImportError:
-                    info = f"""
-                    <div style="line-height: 1.6; font-size: 10pt;">
-                    <h3 style="color: #98c1d9; margin-top: 0; margin-bottom: 12px;">File Details</h3>
-                    
-                    <p><b>Filename:</b> {path.name}</p>
-                    
-                    <div style="background-color: {segmentation_color}33; border-left: 4px solid {segmentation_color}; padding: 8px; margin: 10px 0; border-radius: 4px;">
-                        <b style="color: {segmentation_color};">🏷️ Status:</b> {segmentation_status}
-                    </div>
-                    
-                    <p><b>📊 Format:</b> NIfTI<br>
-                    <b>💾 File Size:</b> {file_size_mb:.2f} MB</p>
-                    
-                    <p><i>💡 For detailed NIfTI information, install nibabel:</i><br>
-                    <code style="background: #2b2b2b; padding: 4px; border-radius: 3px;">pip install nibabel</code></p>
-                    </div>
-                    """
+                    details = (
+                        f"<p><b>Format:</b> NIfTI<br><b>Dimensions:</b> {dim_info}<br>"
+                        f"<b>Voxel Spacing:</b> {spacing_info}<br><b>Data Type:</b> {datatype}</p>"
+                        f"<p><b>Statistics:</b><br>• Voxel Count: {voxel_count:,}<br>"
+                        f"• File Size: {file_size_mb:.2f} MB</p>"
+                        f"<p><b>Technical Info:</b><br>• Affine Matrix: {'Yes' if affine is not None else 'No'}<br>"
+                        "• Header: Valid<br>• Integrity: ✓ Good</p>"
+                    )
                 except Exception as e:
-                    info = f"""
-                    <div style="line-height: 1.6; font-size: 10pt;">
-                    <h3 style="color: #e76f51; margin-top: 0; margin-bottom: 12px;">File Details</h3>
-                    
-                    <p><b>📁 Filename:</b> {path.name}<br>
-                    <b>💾 File Size:</b> {file_size_mb:.2f} MB</p>
-                    
-                    <p style='color: #e76f51;'>⚠️ Limited information available<br>
-                    Error reading header: {str(e)}</p>
-                    </div>
-                    """
+                    title_color = "#e76f51"
+                    status_html = ""
+                    details = (f"<p>{size_html}</p><p style='color: #e76f51;'>⚠️ Limited information available<br>"
+                               f"Error reading header: {e}</p>")
             else:
                 # Unknown file type
-                info = f"""
-                <div style="line-height: 1.6; font-size: 10pt;">
-                <h3 style="color: #98c1d9; margin-top: 0; margin-bottom: 12px;">File Details</h3>
-                
-                <p><b>📁 Filename:</b> {path.name}<br>
-                <b>💾 File Size:</b> {file_size_mb:.2f} MB</p>
-                
-                <p style='color: #f4a261;'>⚠️ Unknown file format</p>
-                </div>
-                """
+                status_html = ""
+                details = f"<p>{size_html}</p><p style='color: #f4a261;'>⚠️ Unknown file format</p>"
             
+            info = _INFO_TPL.substitute(title_color=title_color, filename=path.name,
+                                        status=status_html, details=details)
             self.info_label.setText(info)
+            if has_segmentation is not None:
+                self._info_cache[key] = info
         
         except Exception as e:
             self.info_label.setText(f"""
@@ -522,12 +650,17 @@ class InspectorPanel(QWidget):
             return
         
         filepath = self.available_files[current_row]
-
-        if ".dcm" in filepath:
-            filepath = str(Path(filepath).parent)  # Load entire DICOM folder
         
-        # Auto-detect segmentation status
-        has_segmentation = self.check_if_file_is_segmented(filepath)
+        # Auto-detect segmentation status of the selected file, before a DICOM is swapped
+        # for its folder. The details panel already knows it unless its check is still pending
+        if self._current_seg is not None and self._current_seg[0] == filepath and self._current_seg[1] is not None:
+            has_segmentation = self._current_seg[1]
+        else:
+            has_segmentation = self.check_if_file_is_segmented(filepath)
+            self._current_seg = (filepath, has_segmentation)
+
+        if filepath.endswith(".dcm"):
+            filepath = os.path.dirname(filepath)  # Load entire DICOM folder
         
         # Emit signal
         self.file_selected.emit(filepath, has_segmentation)
@@ -555,53 +688,162 @@ class InspectorPanel(QWidget):
         Returns:
             bool: True if file is segmented, False otherwise
         """
+        try:
+            key = self._file_key(filepath)
+        except OSError as e:
+            print(f"⚠️ Error checking segmentation status: {e}")
+            return False
+        
+        is_segmentation = self._cached_seg(key)
+        if is_segmentation is None:
+            is_segmentation = self._detect_segmentation(filepath)
+            self._store_seg(key, is_segmentation)
+        return is_segmentation
+    
+    def _open_seg_db(self):
+        """Open (and create) the persistent segmentation cache, None if unavailable"""
+        if self._seg_db is None:
+            try:
+                os.makedirs(os.path.dirname(SEG_CACHE_PATH), exist_ok=True)
+                db = sqlite3.connect(SEG_CACHE_PATH)
+                db.execute("PRAGMA journal_mode=WAL")
+                db.execute("PRAGMA synchronous=NORMAL")
+                db.execute("CREATE TABLE IF NOT EXISTS seg("
+                           "path TEXT PRIMARY KEY, mtime INTEGER, size INTEGER, is_seg INTEGER)")
+                self._seg_db = db
+            except (sqlite3.Error, OSError) as e:
+                print(f"⚠️ Segmentation cache unavailable: {e}")
+                self._seg_db = False
+        return self._seg_db or None
+    
+    def _cached_seg(self, key):
+        """Cached segmentation flag for a file key (memory first, then disk), None on a miss"""
+        is_segmentation = self._seg_cache.get(key)
+        if is_segmentation is None:
+            db = self._open_seg_db()
+            if db is not None:
+                try:
+                    row = db.execute("SELECT is_seg FROM seg WHERE path=? AND mtime=? AND size=?",
+                                     (os.path.abspath(key[0]), key[1], key[2])).fetchone()
+                except sqlite3.Error as e:
+                    print(f"⚠️ Error reading segmentation cache: {e}")
+                    row = None
+                if row is not None:
+                    is_segmentation = bool(row[0])
+                    self._seg_cache[key] = is_segmentation
+        return is_segmentation
+    
+    def _store_seg(self, key, is_segmentation):
+        """Remember a segmentation flag in memory and on disk"""
+        self._seg_cache[key] = is_segmentation
+        db = self._open_seg_db()
+        if db is not None:
+            try:
+                with db:
+                    db.execute("INSERT OR REPLACE INTO seg VALUES (?, ?, ?, ?)",
+                               (os.path.abspath(key[0]), key[1], key[2], int(is_segmentation)))
+            except sqlite3.Error as e:
+                print(f"⚠️ Error writing segmentation cache: {e}")
+    
+    def _file_key(self, filepath):
+        """Cache key that changes whenever the file is rewritten"""
+        st = os.stat(filepath)
+        return (filepath, st.st_mtime_ns, st.st_size)
+    
+    def _detect_segmentation(self, filepath):
+        """Uncached segmentation check, see check_if_file_is_segmented"""
         try:
             path = Path(filepath)
             ext = path.suffix.lower()
+            nib, pydicom = optional_module("nibabel"), optional_module("pydicom")
             
             if ext in [".nii", ".gz"]:
                 # NIfTI segmentation detection - OPTIMIZED VERSION
+                if nib is None:
+                    # nibabel not installed, cannot check NIfTI segmentation status
+                    return False
                 try:
-                    import nibabel as nib
-                    import numpy as np
-                    
-                    img = nib.load(str(path))
+                    # Uncompressed .nii voxels are memory-mapped instead of read into memory
+                    img = nib.load(str(path), mmap=True)
+                    
+                    # Header-only rejections before touching any voxels: float data with a
+                    # real scale factor, or a display range beyond label IDs, isn't a label map
+                    header = img.header
+                    slope = float(header['scl_slope'])
+                    if img.get_data_dtype().kind == 'f' and np.isfinite(slope) and slope not in (0, 1):
+                        return False
+                    if float(header['cal_max']) > 100:
+                        return False
                     
                     # OPTIMIZATION: Sample only a small portion of the data (10% or max 1 million voxels)
                     shape = img.shape
                     total_voxels = np.prod(shape[:3])
                     
                     if total_voxels > 1_000_000:
-                        # For large files, use dataobj (lazy loading) and sample strategically
+                        # For large files, use dataobj (lazy loading) and sample strategically,
+                        # taking every 10th voxel in-plane
                         data = img.dataobj
                         
-                        # Sample from center slice and edges
-                        mid_z = shape[2] // 2
-                        sample_indices = [0, mid_z, shape[2] - 1]
+                        if str(path).endswith('.gz'):
+                            # gzip can only be read front to back, so every extra slice costs a
+                            # decompression up to it: sample just the center slice
+                            sample = data[::10, ::10, shape[2] // 2]
+                        else:
+                            # Memory-mapped: one strided read over a few evenly spaced slices
+                            sample = data[::10, ::10, ::max(1, shape[2] // 3)]
                         
-                        samples = []
-                        for z in sample_indices:
-                            # Take every 10th voxel from this slice
-                            slice_data = data[:, :, z]
-                            samples.append(slice_data[::10, ::10])
-                        
-                        sampled_data = np.concatenate([s.flatten() for s in samples])
+                        # The strided read already returns a fresh contiguous array, so
+                        # ravel() is a view rather than another flatten/concatenate copy
+                        sampled_data = np.asarray(sample).ravel()
                     else:
-                        # For small files, load everything
-                        sampled_data = img.get_fdata().flatten()
-                    
-                    # Get statistics from sample
-                    data_min = float(np.min(sampled_data))
-                    data_max = float(np.max(sampled_data))
+                        # For small files, load everything in its stored dtype
+                        # (get_fdata would upcast int masks to float64)
+                        sampled_data = np.asanyarray(img.dataobj).reshape(-1)
+                    
+                    if sampled_data.size == 0:
+                        return False
+                    
+                    seg_probe = _jit_seg_probe()
+                    if seg_probe is not None:
+                        # One JIT pass for min/max and the integer test; distinct values
+                        # are only counted while the sample can still be a label map
+                        data_min, data_max, all_integers = seg_probe(np.ascontiguousarray(sampled_data))
+                        data_min, data_max = float(data_min), float(data_max)
+                        seen = set()
+                        if all_integers and data_max <= 100:
+                            for chunk in np.array_split(sampled_data, SAMPLE_SCAN_CHUNKS):
+                                seen.update(np.unique(chunk).tolist())
+                                if len(seen) > 100:
+                                    break
+                    else:
+                        # Get statistics from sample in one chunked pass: running min/max and
+                        # the distinct values seen so far, stopping as soon as the sample
+                        # can't be a label map (max > 100 or more than 100 values)
+                        data_min = float('inf')
+                        data_max = float('-inf')
+                        seen = set()
+                        for chunk in np.array_split(sampled_data, SAMPLE_SCAN_CHUNKS):
+                            if chunk.size == 0:
+                                continue
+                            data_min = min(data_min, float(chunk.min()))
+                            data_max = max(data_max, float(chunk.max()))
+                            if not data_max <= 100:
+                                break
+                            seen.update(np.unique(chunk).tolist())
+                            if len(seen) > 100:
+                                break
+                        
+                        # Check if all values are integers (always true for integer dtypes)
+                        if sampled_data.dtype.kind in 'iub':
+                            all_integers = True
+                        else:
+                            scratch = sampled_data.astype(np.float32, copy=False)
+                            all_integers = np.allclose(scratch, np.round(scratch))
                     value_range = data_max - data_min
-                    unique_values = np.unique(sampled_data)
-                    num_unique = len(unique_values)
-                    
-                    # Check if all values are integers
-                    all_integers = np.allclose(sampled_data, np.round(sampled_data))
+                    num_unique = len(seen)
                     
                     # Check if has at least one non-zero label
-                    has_nonzero = np.any(sampled_data > 0)
+                    has_nonzero = data_max > 0
                     
                     # STRICT criteria for segmentation detection
                     is_segmentation = (
@@ -622,18 +864,17 @@ class InspectorPanel(QWidget):
                     
                     return is_segmentation
                     
-                except ImportError:
-                    # print(f"⚠️ nibabel not installed, cannot check NIfTI segmentation status")
-                    return False
                 except Exception as e:
                     print(f"⚠️ Error analyzing NIfTI file: {e}")
                     return False
             
             elif ext == ".dcm":
                 # DICOM segmentation detection - already fast (header only)
+                if pydicom is None:
+                    # pydicom not installed, cannot check DICOM segmentation status
+                    return False
                 try:
-                    import pydicom
-                    ds = pydicom.dcmread(str(path), stop_before_pixels=True)
+                    ds = pydicom.dcmread(str(path), stop_before_pixels=True, specific_tags=DICOM_INFO_TAGS)
                     
                     # Check modality
                     modality = str(getattr(ds, "Modality", ""))
@@ -651,9 +892,6 @@ class InspectorPanel(QWidget):
                     
                     return is_segmentation
                     
-                except ImportError:
-                    # print(f"⚠️ pydicom not installed, cannot check DICOM segmentation status")
-                    return False
                 except Exception as e:
                     print(f"⚠️ Error analyzing DICOM file: {e}")
                     return False
@@ -677,7 +915,7 @@ class InspectorPanel(QWidget):
     
     def show_load_confirmation(self, filepath, has_seg):
         """Show confirmation dialog when file is loaded"""
-        filename = Path(filepath).name
+        filename = os.path.basename(filepath)
         status_text = "Already Segmented ✅" if has_seg else "AI Segmentation Needed 🤖"
         
         msg = QMessageBox(self)
@@ -707,8 +945,9 @@ class InspectorPanel(QWidget):
     @property
     def has_segmentation(self):
         """Check if selected file has segmentation (auto-detected)"""
-        if self.selected_filepath:
-            return self.check_if_file_is_segmented(self.selected_filepath)
+        # Reads the status already shown for the selection, never re-analyzes the file
+        if self._current_seg and self._current_seg[0] == self.selected_filepath:
+            return self._current_seg[1]
         return False
     
     @property
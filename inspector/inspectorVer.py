@@ -3,20 +3,269 @@
 from PySide6.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, 
     QListWidget, QLabel, QFileDialog, 
-    QGroupBox, QMessageBox, QFrame, QScrollArea
+    QGroupBox, QMessageBox, QFrame
 )
-from PySide6.QtCore import Signal, Qt
-from PySide6.QtGui import QFont
+from PySide6.QtCore import Signal, Qt, QThreadPool
+from PySide6.QtGui import QFont, QColor, QIcon, QPainter, QPixmap
 from pathlib import Path
+from string import Template
+from inspector.Inspector import InfoBrowser, SegCheckJob, SegCheckSignals, optional_module
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+import functools
+import gzip
+import multiprocessing
+import math
+import numpy as np
+import os
+import re
+import struct
 import sys
 
-class ScrollLabel(QLabel):
-    """A QLabel with automatic scrolling for long content"""
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.setWordWrap(True)
-        self.setTextFormat(Qt.TextFormat.RichText)
-        self.setAlignment(Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignTop)
+# Most distinct values a label map is allowed to have
+MAX_LABELS = 100
+# Worker processes for the directory prefetch. Spawned workers re-import the app,
+# so a few are enough to keep the list coloring ahead of the user
+PREFETCH_WORKERS = max(1, min(4, (os.cpu_count() or 2) // 2))
+# DICOM Segmentation Storage SOP Class UID
+_SEG_SOP = "1.2.840.10008.5.1.4.1.1.66.4"
+# "seg" as its own token in a DICOM file name (scan_seg.dcm, SEG-001.dcm), which
+# exporters use for segmentation objects; not matched inside words like "segment"
+_SEG_NAME_RE = re.compile(r'(?:^|[_\-. ])seg(?:[_\-. ]|\d|$)', re.IGNORECASE)
+
+# Extensions the panel lists, any case (.nii, .nii.gz, .dcm)
+_MED_EXT_RE = re.compile(r'\.(?:nii(?:\.gz)?|dcm)$', re.IGNORECASE)
+
+# NIfTI-1 datatype codes -> dtype names, for display without nibabel
+_NIFTI_DTYPES = {
+    2: "uint8", 4: "int16", 8: "int32", 16: "float32", 32: "complex64",
+    64: "float64", 128: "RGB", 256: "int8", 512: "uint16", 768: "uint32",
+    1024: "int64", 1280: "uint64", 1536: "float128", 1792: "complex128",
+}
+
+# Compact file info HTML shared by every format, only $extra/$hint differ. The
+# segmentation status is the list row's icon, not part of the details
+_INFO_TPL = Template(
+    '<div style="line-height: 1.5; font-size: 9pt;">'
+    '<p style="margin: 2px 0;"><b>$name</b></p>'
+    '<p style="margin: 2px 0;"><b>Format:</b> $format<br>$extra<b>Size:</b> $size MB</p>$hint</div>'
+)
+_INSTALL_HINT = Template('<p style="margin: 5px 0; font-size: 8pt;"><i>Install $package for details</i></p>')
+
+def _count_labels(data, data_min):
+    """
+    Distinct values of integer-valued samples that span at most a few hundred
+    values, counted with one bincount instead of a sort
+    """
+    offsets = np.rint(data - data_min).astype(np.intp)
+    return int(np.count_nonzero(np.bincount(offsets)))
+
+def _seg_scan(data):
+    """
+    Fused min/max/distinct-count/integer test over the sample in one pass.
+    Label maps lie in (-500, 100] (0 < max <= 100, range <= 500), so the scan
+    stops at the first voxel outside it or off an integer; the partial
+    result still fails the criteria then
+    """
+    mn = data[0]
+    mx = data[0]
+    seen = np.zeros(601, np.uint8)
+    count = 0
+    ints = True
+    for i in range(data.size):
+        v = data[i]
+        if v < mn:
+            mn = v
+        if v > mx:
+            mx = v
+        f = float(v)
+        # NaN/inf, or further from the nearest integer than np.allclose allows
+        if f - f != 0:
+            ints = False
+            break
+        r = math.floor(f + 0.5)
+        if abs(f - r) > 1e-8 + 1e-5 * abs(r):
+            ints = False
+            break
+        if r > 100 or r < -500:
+            break
+        idx = int(r) + 500
+        if seen[idx] == 0:
+            seen[idx] = 1
+            count += 1
+    return mn, mx, count, ints
+
+@functools.lru_cache(maxsize=None)
+def _jit_seg_scan():
+    """_seg_scan compiled by numba on first use, None without numba"""
+    numba = optional_module("numba")
+    return numba.njit(cache=True, boundscheck=False)(_seg_scan) if numba is not None else None
+
+@dataclass
+class FileEntry:
+    """A listed file with the stat details the panel needs, taken at scan time"""
+    path: str
+    name: str
+    size: int
+    mtime_ns: int
+    ext: str
+    
+    @classmethod
+    def from_stat(cls, path, st, ext=None):
+        name = os.path.basename(path)
+        if ext is None:
+            match = _MED_EXT_RE.search(name)
+            ext = match.group(0).lower() if match else os.path.splitext(name)[1].lower()
+        return cls(path, name, st.st_size, st.st_mtime_ns, ext)
+    
+    @property
+    def key(self):
+        """Same (path, mtime_ns, size) cache key as InspectorPanelVertical._file_key"""
+        return (self.path, self.mtime_ns, self.size)
+
+def _read_nifti_header(filepath):
+    """Shape, spacing and dtype straight from the 348-byte NIfTI-1 header"""
+    opener = gzip.open if filepath.lower().endswith(".gz") else open
+    with opener(filepath, "rb") as f:
+        buf = f.read(348)
+    if len(buf) < 348:
+        raise ValueError("truncated NIfTI header")
+    # sizeof_hdr is 348 in the file's own byte order
+    for endian in "<>":
+        if struct.unpack(endian + "i", buf[:4])[0] == 348:
+            break
+    else:
+        raise ValueError("not a NIfTI-1 header")
+    dim = struct.unpack(endian + "8h", buf[40:56])
+    datatype = struct.unpack(endian + "h", buf[70:72])[0]
+    pixdim = struct.unpack(endian + "8f", buf[76:108])
+    ndim = dim[0]
+    if not 1 <= ndim <= 7:
+        raise ValueError(f"invalid dim[0] {ndim}")
+    return {
+        "shape": dim[1:ndim + 1],
+        "zooms": pixdim[1:ndim + 1],
+        "dtype": _NIFTI_DTYPES.get(datatype, f"code {datatype}"),
+    }
+
+def _nifti_is_segmentation(img):
+    """Segmentation heuristic over a sample of an opened NIfTI image"""
+    # Float data with a real scale factor is a rescaled intensity volume, not labels
+    slope = float(img.header['scl_slope'])
+    if img.get_data_dtype().kind == 'f' and np.isfinite(slope) and slope not in (0, 1):
+        return False
+
+    shape = img.shape
+    total_voxels = np.prod(shape[:3])
+
+    if total_voxels > 1_000_000:
+        data = img.dataobj
+        mid_z = shape[2] // 2
+        sample_indices = [0, mid_z, shape[2] - 1]
+
+        # Strided reads of every 10th voxel straight into one preallocated
+        # buffer (the first read fixes the dtype, scaling can change it)
+        first = np.asarray(data[::10, ::10, sample_indices[0]])
+        samples = np.empty((len(sample_indices),) + first.shape, dtype=first.dtype)
+        samples[0] = first
+        for i, z in enumerate(sample_indices[1:], 1):
+            samples[i] = data[::10, ::10, z]
+
+        sampled_data = samples.ravel()
+    else:
+        # Stored dtype, get_fdata would upcast int masks to float64
+        sampled_data = np.asarray(img.dataobj).ravel()
+
+    if sampled_data.size == 0:
+        return False
+
+    seg_scan = _jit_seg_scan()
+    if seg_scan is not None:
+        data_min, data_max, num_unique, all_integers = seg_scan(np.ascontiguousarray(sampled_data))
+        data_min, data_max = float(data_min), float(data_max)
+        return (
+            all_integers and
+            0 < data_max <= 100 and
+            data_max - data_min <= 500 and
+            num_unique <= MAX_LABELS
+        )
+
+    # Without numba: cheapest test first: intensity volumes (CT/MRI) already fail on the max
+    data_max = float(sampled_data.max())
+    if data_max > 100 or data_max <= 0:
+        return False
+    data_min = float(sampled_data.min())
+    if data_max - data_min > 500:
+        return False
+
+    if sampled_data.dtype.kind not in 'iu':
+        scratch = sampled_data.astype(np.float32, copy=False)
+        if not np.allclose(scratch, np.round(scratch)):
+            return False
+
+    return _count_labels(sampled_data, data_min) <= MAX_LABELS
+
+def _open_nifti(filepath):
+    """Memory-mapped NIfTI image whose file stays open for the later voxel reads"""
+    return optional_module("nibabel").load(filepath, mmap=True, keep_file_open=True)
+
+def _inspect_nifti(filepath, img=None):
+    """Header details plus segmentation flag of a NIfTI file from one nib.load"""
+    if img is None:
+        img = _open_nifti(filepath)
+    return {
+        "shape": img.shape,
+        "zooms": img.header.get_zooms(),
+        "dtype": img.get_data_dtype(),
+        "is_segmentation": _nifti_is_segmentation(img),
+    }
+
+def _classify(filepath, img=None):
+    """
+    (segmentation flag, NIfTI header details or None) of a file. Kept free of
+    Qt and panel state so it can run in a worker process. img is an already
+    opened NIfTI image of the file, if the caller has one
+    """
+    try:
+        path = Path(filepath)
+        ext = path.suffix.lower()
+
+        if ext in [".nii", ".gz"]:
+            if optional_module("nibabel") is None:
+                return False, None
+            try:
+                meta = _inspect_nifti(filepath, img)
+                return meta["is_segmentation"], meta
+
+            except Exception as e:
+                print(f"Error analyzing NIfTI: {e}")
+                return False, None
+
+        elif ext == ".dcm":
+            # Named like a segmentation export: no need to open the file
+            if _SEG_NAME_RE.search(path.stem):
+                return True, None
+            pydicom = optional_module("pydicom")
+            if pydicom is None:
+                return False, None
+            try:
+                ds = pydicom.dcmread(str(path), stop_before_pixels=True,
+                                     specific_tags=["Modality", "SOPClassUID"])
+
+                modality = str(getattr(ds, "Modality", ""))
+                sop_class = str(getattr(ds, "SOPClassUID", ""))
+
+                return (modality == "SEG" or sop_class == _SEG_SOP), None
+
+            except Exception as e:
+                print(f"Error analyzing DICOM: {e}")
+                return False, None
+
+        return False, None
+
+    except Exception as e:
+        print(f"Error checking segmentation: {e}")
+        return False, None
 
 class InspectorPanelVertical(QWidget):
     """
@@ -32,6 +281,43 @@ class InspectorPanelVertical(QWidget):
         super().__init__()
         self.current_directory = None
         self.available_files = []
+        # (path, mtime_ns, size) -> segmentation flag / info HTML, so re-selecting
+        # or loading a file doesn't re-open and re-sample it
+        self._seg_cache = {}
+        self._info_cache = {}
+        # (path, mtime_ns, size) -> NIfTI header details, filled by the same load
+        # that samples the voxels for the segmentation check
+        self._meta_cache = {}
+        # Segmentation checks run on the thread pool; keys of the ones in flight
+        # and the list row of every scanned file for painting results
+        self._seg_jobs = set()
+        self._row_of = {}
+        # path -> FileEntry of every scanned file, so selections don't stat again
+        self._entries = {}
+        # directory -> (mtime_ns, [(path, ext)]) of its last scan. Adding, removing or
+        # renaming a file bumps the directory mtime, which forces a fresh scandir; a file
+        # rewritten in place doesn't, so the matches are statted again on every scan
+        self._dir_cache = {}
+        self._seg_signals = SegCheckSignals(self)
+        self._seg_signals.finished.connect(self._on_seg_check_done)
+        # Status dots for the file rows, painted once
+        self._icon_seg = QIcon(self._make_dot("#2a9d8f"))
+        self._icon_need = QIcon(self._make_dot("#f4a261"))
+        # Directory prefetch runs in a process pool (the voxel sampling holds the
+        # GIL); created on first scan, futures of the current scan kept to cancel.
+        # Shut down when a file is loaded, the panel closes or the app quits
+        self._pool = None
+        self._prefetch = []
+        app = QApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self._shutdown_prefetch)
+        # (path, flag or None while pending) of the file shown last, for load_file
+        self._last_seg = None
+        # (cache key, memory-mapped image) of the NIfTI file checked last in this
+        # process, handed to the viewer on load instead of opening the file again.
+        # Dropped once handed over, so the viewer's decoded volume cached on the
+        # image isn't kept alive here after it moves on
+        self._last_img = None
         self.setup_ui()
         self.apply_styles()
         self.main = main
@@ -81,18 +367,13 @@ class InspectorPanelVertical(QWidget):
         info_title.setFont(QFont("Arial", 10, QFont.Weight.Bold))
         main_layout.addWidget(info_title)
         
-        # Create scrollable info area
-        info_scroll = QScrollArea()
-        info_scroll.setWidgetResizable(True)
-        info_scroll.setMinimumHeight(150)
-        info_scroll.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAsNeeded)
-        info_scroll.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAsNeeded)
-        
-        self.info_label = ScrollLabel("Select a file to see details")
-        self.info_label.setStyleSheet("background-color: #1a1a1a; padding: 10px; border-radius: 4px;")
-        info_scroll.setWidget(self.info_label)
+        # Create scrollable info area (a text document, no label relayout per selection)
+        self.info_label = InfoBrowser("Select a file to see details")
+        self.info_label.setMinimumHeight(150)
+        self.info_label.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAsNeeded)
+        self.info_label.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAsNeeded)
         
-        main_layout.addWidget(info_scroll, stretch=1)
+        main_layout.addWidget(self.info_label, stretch=1)
         
         # ===== LOAD BUTTON =====
         self.btn_load = QPushButton("Load")
@@ -173,10 +454,12 @@ class InspectorPanelVertical(QWidget):
                 color: #e0e0e0;
             }
             
-            QScrollArea {
+            QTextBrowser {
                 border: 1px solid #3d5a80;
                 border-radius: 6px;
                 background-color: #1a1a1a;
+                color: #e0e0e0;
+                padding: 10px;
             }
             
             QScrollBar:vertical {
@@ -223,22 +506,43 @@ class InspectorPanelVertical(QWidget):
         
         self.available_files = []
         self.file_list.clear()
+        self._cancel_prefetch()
         
         try:
-            directory = Path(self.current_directory)
-            
-            # Find NIfTI files (.nii and .nii.gz)
-            nifti_files = list(directory.glob("*.nii")) + list(directory.glob("*.nii.gz"))
-            # Find DICOM files (.dcm)
-            dicom_files = list(directory.glob("*.dcm"))
-            
-            # Combine and sort
-            all_files = sorted(nifti_files + dicom_files)
-            
-            # Store all files
-            for file in all_files:
-                self.available_files.append(str(file))
-                self.file_list.addItem(file.name)
+            # Reuse the file names of an unchanged directory. Otherwise find NIfTI (.nii, .nii.gz)
+            # and DICOM (.dcm) files in a single pass. Each match is statted on every scan so
+            # files rewritten in place get a fresh cache key
+            directory = self.current_directory
+            dir_mtime = os.stat(directory).st_mtime_ns
+            cached = self._dir_cache.get(directory)
+            if cached is not None and cached[0] == dir_mtime:
+                matches = cached[1]
+            else:
+                matches = []
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        match = _MED_EXT_RE.search(entry.name)
+                        if match and entry.is_file():
+                            matches.append((entry.path, match.group(0).lower()))
+                self._dir_cache[directory] = (dir_mtime, matches)
+            file_entries = {}
+            for path, ext in matches:
+                try:
+                    file_entries[path] = FileEntry.from_stat(path, os.stat(path), ext)
+                except OSError:
+                    # Removed since the listing; the directory mtime catches it next scan
+                    continue
+            all_files = sorted(file_entries)
+            self._entries = file_entries
+            
+            # Store all files, inserting the rows in one batch without repaints
+            self.available_files = all_files
+            self.file_list.setUpdatesEnabled(False)
+            self.file_list.blockSignals(True)
+            self.file_list.addItems([file_entries[file].name for file in all_files])
+            self.file_list.blockSignals(False)
+            self.file_list.setUpdatesEnabled(True)
+            self._row_of = {file: row for row, file in enumerate(all_files)}
             
             # Update UI with correct count
             total_count = len(self.available_files)
@@ -255,6 +559,9 @@ class InspectorPanelVertical(QWidget):
                 if total_count > 0:
                     self.file_list.setCurrentRow(0)
                     self.show_file_info(self.available_files[0])
+                
+                # Work out the status of the remaining files before they're clicked
+                self._prefetch_seg_status()
         
         except Exception as e:
             QMessageBox.critical(
@@ -271,6 +578,97 @@ class InspectorPanelVertical(QWidget):
         filepath = self.available_files[row]
         self.show_file_info(filepath)
     
+    def _prefetch_seg_status(self):
+        """Check every listed file in the process pool, coloring cached ones right away"""
+        for filepath in self.available_files:
+            try:
+                key = self._file_key(filepath)
+            except OSError:
+                continue
+            if key in self._seg_cache:
+                self._mark_row(filepath, self._seg_cache[key])
+                continue
+            if key in self._seg_jobs:
+                continue
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=PREFETCH_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            self._seg_jobs.add(key)
+            future = self._pool.submit(_classify, filepath)
+            future.add_done_callback(functools.partial(self._on_prefetch_done, filepath, key))
+            self._prefetch.append((key, future))
+    
+    def _cancel_prefetch(self):
+        """Drop prefetch checks of the previous scan that haven't started yet"""
+        for key, future in self._prefetch:
+            if future.cancel():
+                self._seg_jobs.discard(key)
+        self._prefetch = []
+    
+    def _shutdown_prefetch(self):
+        """Stop the prefetch pool, dropping its queued checks, so it doesn't compete with the viewer"""
+        if self._pool is None:
+            return
+        self._cancel_prefetch()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = None
+    
+    def closeEvent(self, event):
+        self._shutdown_prefetch()
+        super().closeEvent(event)
+    
+    def _on_prefetch_done(self, filepath, key, future):
+        """Hand a finished prefetch result to the UI thread (runs on an executor thread)"""
+        if future.cancelled():
+            return
+        try:
+            is_segmentation, meta = future.result()
+        except Exception as e:
+            print(f"Error checking segmentation: {e}")
+            is_segmentation, meta = False, None
+        if meta is not None:
+            self._meta_cache[key] = meta
+        self._seg_signals.finished.emit(filepath, key, bool(is_segmentation))
+    
+    def _start_seg_check(self, filepath, key):
+        """Queue a background segmentation check unless one is already running"""
+        if key in self._seg_jobs:
+            return
+        self._seg_jobs.add(key)
+        job = SegCheckJob(filepath, key, self._detect_segmentation, self._seg_signals)
+        QThreadPool.globalInstance().start(job)
+    
+    def _on_seg_check_done(self, filepath, key, is_segmentation):
+        """Store a finished check, mark its row and refresh the details if it's selected"""
+        self._seg_jobs.discard(key)
+        self._seg_cache[key] = is_segmentation
+        self._mark_row(filepath, is_segmentation)
+        if self.selected_filepath == filepath:
+            self.show_file_info(filepath)
+    
+    def _mark_row(self, filepath, is_segmentation):
+        """Show a file's segmentation status as its row icon"""
+        row = self._row_of.get(filepath)
+        item = self.file_list.item(row) if row is not None else None
+        if item is not None:
+            item.setIcon(self._icon_seg if is_segmentation else self._icon_need)
+            item.setToolTip("Already Segmented" if is_segmentation else "AI Segmentation Needed")
+    
+    @staticmethod
+    def _make_dot(color):
+        """A 12x12 pixmap with a filled circle of the given color"""
+        pixmap = QPixmap(12, 12)
+        pixmap.fill(Qt.GlobalColor.transparent)
+        painter = QPainter(pixmap)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter.setPen(Qt.PenStyle.NoPen)
+        painter.setBrush(QColor(color))
+        painter.drawEllipse(1, 1, 10, 10)
+        painter.end()
+        return pixmap
+    
     def on_file_double_clicked(self, item):
         """Handle double-click on file"""
         self.load_file()
@@ -278,120 +676,111 @@ class InspectorPanelVertical(QWidget):
     def show_file_info(self, filepath):
         """Display file metadata with compact formatting for vertical layout"""
         try:
-            path = Path(filepath)
-            file_size_mb = path.stat().st_size / (1024 * 1024)
-            
-            # Auto-detect segmentation status
-            has_segmentation = self.check_if_file_is_segmented(str(path))
-            
-            # Set status
-            segmentation_status = "Already Segmented" if has_segmentation else "AI Segmentation Needed"
-            segmentation_color = "#2a9d8f" if has_segmentation else "#f4a261"
+            entry = self._entries.get(filepath) or FileEntry.from_stat(filepath, os.stat(filepath))
+            key = entry.key
+            has_segmentation = self._seg_cache.get(key)
+            self._last_seg = (filepath, has_segmentation)
+            cached_info = self._info_cache.get(key)
+            if cached_info is not None:
+                self.info_label.setText(cached_info)
+                return
+            file_size_mb = entry.size / (1024 * 1024)
+            
+            # Auto-detect segmentation status. This reads voxel data, so unless it's
+            # cached it runs on the thread pool; the result shows as the row's icon
+            if has_segmentation is None:
+                self._start_seg_check(filepath, key)
+            
+            # Details still waiting on that check, not cached until they're complete
+            pending = False
+            ext = entry.ext
+            nib, pydicom = optional_module("nibabel"), optional_module("pydicom")
+            params = {
+                "name": entry.name,
+                "format": "",
+                "extra": "",
+                "size": f"{file_size_mb:.2f}",
+                "hint": "",
+            }
             
-            ext = path.suffix.lower()
+            if ext == ".dcm" and pydicom is None:
+                params["format"] = "DICOM"
+                params["hint"] = _INSTALL_HINT.substitute(package="pydicom")
+                info = _INFO_TPL.substitute(params)
             
-            if ext == ".dcm":
+            elif ext == ".dcm":
                 # DICOM file handling
+                params["format"] = "DICOM"
                 try:
-                    import pydicom
-                    ds = pydicom.dcmread(str(path), stop_before_pixels=True)
+                    ds = pydicom.dcmread(filepath, stop_before_pixels=True)
                     patient = str(getattr(ds, "PatientName", "Unknown"))
                     modality = str(getattr(ds, "Modality", "N/A"))
                     study_date = str(getattr(ds, "StudyDate", "N/A"))
                     rows = getattr(ds, "Rows", "?")
                     cols = getattr(ds, "Columns", "?")
                     
-                    info = f"""
-                    <div style="line-height: 1.5; font-size: 9pt;">
-                    <p style="margin: 2px 0;"><b>{path.name}</b></p>
-                    
-                    <div style="background-color: {segmentation_color}33; border-left: 3px solid {segmentation_color}; padding: 5px; margin: 8px 0; border-radius: 3px;">
-                        <b style="color: {segmentation_color};">Status: {segmentation_status}</b>
-                    </div>
-                    
-                    <p style="margin: 2px 0;"><b>Format:</b> DICOM<br>
-                    <b>Patient:</b> {patient}<br>
-                    <b>Modality:</b> {modality}<br>
-                    <b>Date:</b> {study_date}<br>
-                    <b>Dimensions:</b> {rows} × {cols}<br>
-                    <b>Size:</b> {file_size_mb:.2f} MB</p>
-                    </div>
-                    """
-                except ImportError:
-                    info = f"""
-                    <div style="line-height: 1.5; font-size: 9pt;">
-                    <p style="margin: 2px 0;"><b>{path.name}</b></p>
-                    
-                    <div style="background-color: {segmentation_color}33; border-left: 3px solid {segmentation_color}; padding: 5px; margin: 8px 0; border-radius: 3px;">
-                        <b style="color: {segmentation_color};">Status: {segmentation_status}</b>
-                    </div>
-                    
-                    <p style="margin: 2px 0;"><b>Format:</b> DICOM<br>
-                    <b>Size:</b> {file_size_mb:.2f} MB</p>
-                    
-                    <p style="margin: 5px 0; font-size: 8pt;"><i>Install pydicom for details</i></p>
-                    </div>
-                    """
+                    params["extra"] = (
+                        f"<b>Patient:</b> {patient}<br><b>Modality:</b> {modality}<br>"
+                        f"<b>Date:</b> {study_date}<br><b>Dimensions:</b> {rows} × {cols}<br>"
+                    )
+                    info = _INFO_TPL.substitute(params)
                 except Exception as e:
                     info = f"<p style='color: #e76f51;'>Error: {str(e)}</p>"
             
-            elif ext in [".nii", ".gz"]:
+            elif ext in [".nii", ".nii.gz"]:
                 # NIfTI file handling
+                params["format"] = "NIfTI"
                 try:
-                    import nibabel as nib
-                    img = nib.load(str(path))
-                    shape = img.shape
-                    spacing = img.header.get_zooms()
-                    datatype = img.get_data_dtype()
-                    
-                    # Format dimensions
-                    if len(shape) >= 3:
-                        dim_info = f"{shape[0]}×{shape[1]}×{shape[2]}"
-                    else:
-                        dim_info = "×".join(str(s) for s in shape)
+                    meta = self._meta_cache.get(key)
+                    if meta is None:
+                        # Display only needs the header, no nibabel load or decompression
+                        # past the first block
+                        try:
+                            meta = _read_nifti_header(filepath)
+                        except (OSError, ValueError, EOFError, struct.error):
+                            meta = None
+                    if meta is None and has_segmentation is not None and nib is None:
+                        params["hint"] = _INSTALL_HINT.substitute(package="nibabel")
+                    elif meta is None and has_segmentation is not None:
+                        # Not a plain NIfTI-1 header, let nibabel load it or report why
+                        img = nib.load(filepath)
+                        meta = {"shape": img.shape, "zooms": img.header.get_zooms(),
+                                "dtype": img.get_data_dtype()}
                     
-                    # Format spacing
-                    if len(spacing) >= 3:
-                        spacing_info = f"{spacing[0]:.1f}×{spacing[1]:.1f}×{spacing[2]:.1f}mm"
+                    if meta is None:
+                        # Unreadable header, details arrive with the pending check's load
+                        dim_info = spacing_info = datatype = "..."
+                        pending = has_segmentation is None
                     else:
-                        spacing_info = "×".join(f"{s:.1f}" for s in spacing) + "mm"
-                    
-                    info = f"""
-                    <div style="line-height: 1.5; font-size: 9pt;">
-                    <p style="margin: 2px 0;"><b>{path.name}</b></p>
-                    
-                    <div style="background-color: {segmentation_color}33; border-left: 3px solid {segmentation_color}; padding: 5px; margin: 8px 0; border-radius: 3px;">
-                        <b style="color: {segmentation_color};">Status: {segmentation_status}</b>
-                    </div>
-                    
-                    <p style="margin: 2px 0;"><b>Format:</b> NIfTI<br>
-                    <b>Dimensions:</b> {dim_info}<br>
-                    <b>Spacing:</b> {spacing_info}<br>
-                    <b>Data Type:</b> {datatype}<br>
-                    <b>Size:</b> {file_size_mb:.2f} MB</p>
-                    </div>
-                    """
-                except ImportError:
-                    info = f"""
-                    <div style="line-height: 1.5; font-size: 9pt;">
-                    <p style="margin: 2px 0;"><b>{path.name}</b></p>
-                    
-                    <div style="background-color: {segmentation_color}33; border-left: 3px solid {segmentation_color}; padding: 5px; margin: 8px 0; border-radius: 3px;">
-                        <b style="color: {segmentation_color};">Status: {segmentation_status}</b>
-                    </div>
-                    
-                    <p style="margin: 2px 0;"><b>Format:</b> NIfTI<br>
-                    <b>Size:</b> {file_size_mb:.2f} MB</p>
+                        shape = meta["shape"]
+                        spacing = meta["zooms"]
+                        datatype = meta["dtype"]
+                        
+                        # Format dimensions
+                        if len(shape) >= 3:
+                            dim_info = f"{shape[0]}×{shape[1]}×{shape[2]}"
+                        else:
+                            dim_info = "×".join(str(s) for s in shape)
+                        
+                        # Format spacing
+                        if len(spacing) >= 3:
+                            spacing_info = f"{spacing[0]:.1f}×{spacing[1]:.1f}×{spacing[2]:.1f}mm"
+                        else:
+                            spacing_info = "×".join(f"{s:.1f}" for s in spacing) + "mm"
                     
-                    <p style="margin: 5px 0; font-size: 8pt;"><i>Install nibabel for details</i></p>
-                    </div>
-                    """
+                    params["extra"] = (
+                        f"<b>Dimensions:</b> {dim_info}<br><b>Spacing:</b> {spacing_info}<br>"
+                        f"<b>Data Type:</b> {datatype}<br>"
+                    )
+                    info = _INFO_TPL.substitute(params)
                 except Exception as e:
                     info = f"<p style='color: #e76f51;'>Error: {str(e)}</p>"
             else:
                 info = f"<p style='color: #f4a261;'>Unknown format</p>"
             
             self.info_label.setText(info)
+            if not pending:
+                self._info_cache[key] = info
         
         except Exception as e:
             self.info_label.setText(f"<p style='color: #e76f51;'>Error: {str(e)}</p>")
@@ -409,13 +798,30 @@ class InspectorPanelVertical(QWidget):
             return
         
         filepath = self.available_files[current_row]
-
         
-        if ".dcm" in filepath:
+        # The details panel already knows the flag unless its check is still pending
+        if self._last_seg is not None and self._last_seg[0] == filepath and self._last_seg[1] is not None:
+            has_segmentation = self._last_seg[1]
+        else:
+            has_segmentation = self.check_if_file_is_segmented(filepath)
+        
+        img = None
+        if filepath.lower().endswith(".dcm"):
             filepath = str(Path(filepath).parent)  # Load entire DICOM folder
-
-            
-        has_segmentation = self.check_if_file_is_segmented(filepath)
+        elif optional_module("nibabel") is not None:
+            try:
+                key = self._file_key(filepath)
+                if self._last_img is not None and self._last_img[0] == key:
+                    img = self._last_img[1]
+                    self._last_img = None
+                else:
+                    img = _open_nifti(filepath)
+            except Exception as e:
+                print(f"Error opening NIfTI, loading by path: {e}")
+                img = None
+        
+        # The rest of the folder doesn't need classifying while the viewer loads
+        self._shutdown_prefetch()
         
         # Emit signal
         self.file_selected.emit(filepath, has_segmentation)
@@ -426,86 +832,57 @@ class InspectorPanelVertical(QWidget):
         print(f"   Segmented: {'Yes' if has_segmentation else 'No'}")
         print(f"{'='*50}\n")
 
-        self.main.load_path(filepath)
+        if img is not None:
+            self.main.load_img(filepath, img)
+        else:
+            self.main.load_path(filepath)
     
     # ========== HELPER METHODS ==========
     
     def check_if_file_is_segmented(self, filepath):
-        """Check if file is segmented (optimized sampling)"""
+        """Check if file is segmented (optimized sampling, cached per file version)"""
         try:
-            path = Path(filepath)
-            ext = path.suffix.lower()
-            
-            if ext in [".nii", ".gz"]:
-                try:
-                    import nibabel as nib
-                    import numpy as np
-                    
-                    img = nib.load(str(path))
-                    shape = img.shape
-                    total_voxels = np.prod(shape[:3])
-                    
-                    if total_voxels > 1_000_000:
-                        data = img.dataobj
-                        mid_z = shape[2] // 2
-                        sample_indices = [0, mid_z, shape[2] - 1]
-                        
-                        samples = []
-                        for z in sample_indices:
-                            slice_data = data[:, :, z]
-                            samples.append(slice_data[::10, ::10])
-                        
-                        sampled_data = np.concatenate([s.flatten() for s in samples])
-                    else:
-                        sampled_data = img.get_fdata().flatten()
-                    
-                    data_min = float(np.min(sampled_data))
-                    data_max = float(np.max(sampled_data))
-                    value_range = data_max - data_min
-                    unique_values = np.unique(sampled_data)
-                    num_unique = len(unique_values)
-                    
-                    all_integers = np.allclose(sampled_data, np.round(sampled_data))
-                    has_nonzero = np.any(sampled_data > 0)
-                    
-                    is_segmentation = (
-                        value_range <= 500 and
-                        data_max <= 100 and
-                        num_unique <= 100 and
-                        all_integers and
-                        has_nonzero
-                    )
-                    
-                    return is_segmentation
-                    
-                except ImportError:
-                    return False
-                except Exception as e:
-                    print(f"Error analyzing NIfTI: {e}")
-                    return False
-            
-            elif ext == ".dcm":
-                try:
-                    import pydicom
-                    ds = pydicom.dcmread(str(path), stop_before_pixels=True)
-                    
-                    modality = str(getattr(ds, "Modality", ""))
-                    sop_class = str(getattr(ds, "SOPClassUID", ""))
-                    segmentation_sop = "1.2.840.10008.5.1.4.1.1.66.4"
-                    
-                    return (modality == "SEG" or sop_class == segmentation_sop)
-                    
-                except ImportError:
-                    return False
-                except Exception as e:
-                    print(f"Error analyzing DICOM: {e}")
-                    return False
-            
-            return False
-            
-        except Exception as e:
+            key = self._file_key(filepath)
+        except OSError as e:
             print(f"Error checking segmentation: {e}")
             return False
+        
+        is_segmentation = self._seg_cache.get(key)
+        if is_segmentation is None:
+            is_segmentation = self._detect_segmentation(filepath)
+            self._seg_cache[key] = is_segmentation
+        return is_segmentation
+    
+    def _file_key(self, filepath):
+        """Cache key that changes whenever the file is rewritten (as of the last scan)"""
+        entry = self._entries.get(filepath)
+        if entry is not None:
+            return entry.key
+        st = os.stat(filepath)
+        return (filepath, st.st_mtime_ns, st.st_size)
+    
+    def _detect_segmentation(self, filepath):
+        """
+        Uncached segmentation check, remembering NIfTI header details on the way
+        and keeping the opened image for load_file
+        """
+        img = None
+        if filepath.lower().endswith((".nii", ".nii.gz")) and optional_module("nibabel") is not None:
+            try:
+                img = _open_nifti(filepath)
+            except Exception:
+                img = None  # _classify opens it again and reports the error
+        is_segmentation, meta = _classify(filepath, img)
+        try:
+            key = self._file_key(filepath)
+        except OSError:
+            return is_segmentation
+        # Also runs on pool threads, single attribute/dict stores are atomic under the GIL
+        if meta is not None:
+            self._meta_cache[key] = meta
+        if img is not None:
+            self._last_img = (key, img)
+        return is_segmentation
     
     def update_directory_display(self, directory):
         """Update directory label with shortened path"""
@@ -3,14 +3,146 @@
 # It is responsible for loading serialized data.
 
 import os
+import hashlib
+import pickle
+import mmap
+import struct
 import numpy as np
 import nibabel as nib
 import pydicom
 from pydicom.dataset import FileDataset
 from typing import Optional, Dict, Any, Union, List
 from pathlib import Path
-import dicom2nifti
-import tempfile
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import multiprocessing
+
+# Keeping decoded DICOM volumes across sessions is opt-in (set
+# MULTI_PLANAR_VIEWER_LOAD_CACHE=1): entries are full volumes of patient scans
+LOAD_CACHE_ENABLED = os.environ.get("MULTI_PLANAR_VIEWER_LOAD_CACHE", "") == "1"
+# Where they're kept, keyed by the input's path and its files' mtimes/sizes
+LOAD_CACHE_DIR = os.environ.get(
+    "MULTI_PLANAR_VIEWER_LOAD_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "multi-planar-viewer", "volumes"))
+# Most recently loaded volumes kept in the cache (they're full decoded arrays)
+LOAD_CACHE_MAX_ENTRIES = 8
+# Threads reading DICOM headers of a series; the reads are I/O-bound and
+# pydicom releases the GIL in file reads
+DICOM_READ_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+# Patient-identifying metadata fields never written to the load cache
+DICOM_PHI_FIELDS = ("PatientName", "PatientID", "PatientAge", "PatientSex", "StudyDate")
+# From this many files on, headers are parsed in worker processes: parsing is
+# CPU-bound Python work, and below this the process start-up isn't worth it
+DICOM_PROCESS_MIN_FILES = 256
+# Files handed to a worker process per task
+DICOM_PROCESS_CHUNKSIZE = 16
+# Patient & acquisition fields copied into a DICOM's "metadata"
+DICOM_METADATA_FIELDS = [
+    "PatientName", "PatientID", "PatientAge", "PatientSex",
+    "StudyDescription", "SeriesDescription", "Modality",
+    "StudyDate", "Manufacturer", "SliceThickness", "Rows", "Columns",
+]
+# Tags parsed when scanning a series: slice geometry, rescale plus the metadata
+# fields, so the (often large) private tags of every file are skipped
+DICOM_SERIES_TAGS = [
+    "SeriesInstanceUID", "InstanceNumber", "ImagePositionPatient", "ImageOrientationPatient",
+    "PixelSpacing", "SliceThickness", "Rows", "Columns", "RescaleSlope", "RescaleIntercept",
+    "SamplesPerPixel", "NumberOfFrames", "BitsAllocated", "BitsStored", "PixelRepresentation",
+] + DICOM_METADATA_FIELDS
+# The same tags as numbers, resolved once instead of on every dcmread
+_META_TAGS = sorted({pydicom.datadict.tag_for_keyword(k) for k in DICOM_SERIES_TAGS})
+# (tag, keyword) of the metadata fields, for lookups without keyword resolution
+_METADATA_TAGS = [(pydicom.datadict.tag_for_keyword(k), k) for k in DICOM_METADATA_FIELDS]
+# Uncompressed little-endian transfer syntaxes, whose pixels can be mapped as-is
+_NATIVE_LE_SYNTAXES = {pydicom.uid.ExplicitVRLittleEndian, pydicom.uid.ImplicitVRLittleEndian}
+# Pixel Data (7FE0,0010) tag as stored little-endian
+_PIXEL_DATA_TAG = b"\xe0\x7f\x10\x00"
+# NIfTI header fields copied into "metadata"; the full header stays on the image
+NIFTI_METADATA_FIELDS = ('dim', 'pixdim', 'datatype', 'bitpix', 'descrip', 'xyzt_units',
+                         'qform_code', 'sform_code')
+
+
+def _read_dicom_header(path):
+    """Header of one DICOM file, or None if it isn't one"""
+    try:
+        with open(path, "rb") as f:
+            # defer_size keeps any unexpectedly long value among them unread until used
+            ds = pydicom.dcmread(f, stop_before_pixels=True, specific_tags=_META_TAGS, defer_size="1 KB")
+            # The read stops right at the Pixel Data element
+            ds.pixel_data_offset = f.tell()
+        return ds
+    except Exception as e:
+        print(f"⚠️ Skipping {path}: not a valid DICOM ({e})")
+        return None
+
+
+def _dicom_affine(orientation, dx, dy, dz, origin):
+    """
+    4x4 affine with columns row_dir*dx, col_dir*dy, normal*dz and origin, from an
+    ImageOrientationPatient-style sequence; plain float math, no small temporary arrays
+    """
+    rx, ry, rz, cx, cy, cz = (float(v) for v in orientation)
+    nx, ny, nz = ry * cz - rz * cy, rz * cx - rx * cz, rx * cy - ry * cx
+    ox, oy, oz = (float(v) for v in origin)
+    return np.array([
+        [rx * dx, cx * dy, nx * dz, ox],
+        [ry * dx, cy * dy, ny * dz, oy],
+        [rz * dx, cz * dy, nz * dz, oz],
+        [0.0, 0.0, 0.0, 1.0],
+    ])
+
+
+def _read_native_pixels(ds):
+    """
+    [Rows, Columns] pixels of a single-frame, uncompressed little-endian slice, mapped
+    straight from the file (its header from _read_dicom_header); None when the slice
+    needs pydicom's pixel handlers
+    """
+    try:
+        if (ds.file_meta.TransferSyntaxUID not in _NATIVE_LE_SYNTAXES
+                or int(getattr(ds, "SamplesPerPixel", 1)) != 1
+                or int(getattr(ds, "NumberOfFrames", 1) or 1) != 1
+                or int(ds.BitsAllocated) not in (8, 16, 32)):
+            return None
+        rows, cols = int(ds.Rows), int(ds.Columns)
+        bits, stored = int(ds.BitsAllocated), int(ds.BitsStored)
+        signed = int(getattr(ds, "PixelRepresentation", 0)) == 1
+        dtype = np.dtype(f"<{'i' if signed else 'u'}{bits // 8}")
+        offset = ds.pixel_data_offset
+        # The map stays open as long as the returned view references it
+        with open(ds.filename, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if mm[offset:offset + 4] != _PIXEL_DATA_TAG:
+            return None
+        # Explicit VR: tag, VR, 2 reserved bytes, 4-byte length; implicit: tag, length
+        if ds.file_meta.TransferSyntaxUID == pydicom.uid.ExplicitVRLittleEndian:
+            length, start = struct.unpack_from("<I", mm, offset + 8)[0], offset + 12
+        else:
+            length, start = struct.unpack_from("<I", mm, offset + 4)[0], offset + 8
+        count = rows * cols
+        if length < count * dtype.itemsize or start + count * dtype.itemsize > len(mm):
+            return None
+        pixels = np.frombuffer(mm, dtype=dtype, count=count, offset=start)
+        # Bits above BitsStored may hold overlays: mask them (unsigned) or
+        # sign-extend the stored value (signed), as pydicom does
+        shift = bits - stored
+        if shift > 0 and signed:
+            pixels = (pixels << shift) >> shift
+        elif shift > 0:
+            pixels = pixels & dtype.type((1 << stored) - 1)
+        return pixels.reshape(rows, cols)
+    except Exception:
+        return None
+
+
+def _fits_int16(pixels, intercept):
+    """Whether pixels + an integer intercept stay inside the int16 range"""
+    return (pixels.dtype.kind in "iu" and pixels.size > 0
+            and int(pixels.min()) + intercept >= -32768 and int(pixels.max()) + intercept <= 32767)
+
+
+# Single background thread writing load cache entries, so a cold open doesn't
+# wait for the volume to be saved; created on first write
+_cache_writer = None
 
 
 class DataLoader:
@@ -21,17 +153,21 @@ class DataLoader:
     returns the data in a unified format (regardless of the type of the input file).
     The returned dictionary has the following structure:
     {
-        "image": np.ndarray,          # 3D (or 4D) volume [Z, Y, X]
+        "image": np.ndarray,          # 3D (or 4D) volume [Z, Y, X]; for NIfTI the
+                                      # image's ArrayProxy, read when sliced
         "voxel_spacing": tuple,       # (dx, dy, dz)
         "orientation": np.ndarray,    # 4x4 affine (if available)
         "metadata": dict,             # Patient & acquisition info
         "format": str                 # 'nifti' or 'dicom'
+        "lazy": bool                  # present and True when "image" is a proxy
+        "nifti_obj": nib.Nifti1Image  # NIfTI only: the image the data came from
     }
     """
 
     def __init__(self, path: str):
         self.path = path
         self.data: Optional[Dict[str, Any]] = None
+        self._cache_key = self._compute_cache_key(path)
 
     # PUBLIC API
     def load(self) -> Dict[str, Any]:
@@ -40,6 +176,11 @@ class DataLoader:
             # Note: should display error message in GUI instead of raising exception (to be implemented)
             raise FileNotFoundError(f"Path does not exist: {self.path}")
         
+        cached = self._read_cache()
+        if cached is not None:
+            self.data = cached
+            return self.data
+        
         if os.path.isdir(self.path): # assume a folder of dicom files
             self.data = self._load_dicom_series(self.path)
         else: # assume a single file (nifti or dicom)
@@ -58,12 +199,22 @@ class DataLoader:
             else:
                 # note: should also display GUI error message
                 raise ValueError(f"Unsupported file format: {ext}")
+        self._write_cache(self.data)
+        return self.data
+    
+    def load_image(self, nii: nib.Nifti1Image) -> Dict[str, Any]:
+        """ Use an already opened NIfTI image (for self.path) instead of reading it again """
+        self.data = self._nifti_to_data(nii)
         return self.data
     
     # NIfTI loader
     def _load_nifti_file(self, file_path: str) -> Dict[str, Any]:
-        nii = nib.load(file_path)
-        image = nii.get_fdata(dtype=np.float32)
+        return self._nifti_to_data(nib.load(file_path))
+    
+    def _nifti_to_data(self, nii: nib.Nifti1Image) -> Dict[str, Any]:
+        # Keep the proxy (memory-mapped for .nii): voxels are only read when the
+        # viewer or an export slices them, not decoded into a float copy here
+        image = nii.dataobj
         affine = nii.affine
         header = nii.header
 
@@ -72,7 +223,7 @@ class DataLoader:
         # This maintains consistency with 3D output format.
         zooms = header.get_zooms()
         voxel_spacing = tuple(zooms[:3] + (1.0,) * (3 - len(zooms[:3])))
-        metadata = {k: str(header[k]) for k in header.keys()}
+        metadata = {k: str(header[k]) for k in NIFTI_METADATA_FIELDS}
 
         return {
             "image": image,
@@ -80,13 +231,23 @@ class DataLoader:
             "orientation": affine,
             "metadata": metadata,
             "format": "nifti",
+            "lazy": True,
+            "nifti_obj": nii,
         }
     
     # DICOM loader
     def _load_dicom_file(self, file_path: str) -> Dict[str, Any]:
         """load a single dicom file"""
         ds = pydicom.dcmread(file_path)
-        image = ds.pixel_array.astype(np.float32)
+        pixels = ds.pixel_array
+        # Integer data with an identity slope stays int16 (half the memory of float32)
+        slope = float(getattr(ds, 'RescaleSlope', 1.0))
+        intercept = float(getattr(ds, 'RescaleIntercept', 0.0))
+        exact = slope == 1.0 and intercept.is_integer() and _fits_int16(pixels, int(intercept))
+        # [Z, Y, X] for consistency, the pixels cast straight into it
+        image = np.empty((1, int(ds.Rows), int(ds.Columns)), dtype=np.int16 if exact else np.float32)
+        image[0] = pixels
+        del pixels, ds.PixelData  # the decoded copy is all that's needed now
 
         image = self._apply_dicom_rescale(image, ds)
 
@@ -94,7 +255,7 @@ class DataLoader:
         metadata = self._extract_metadata(ds)
 
         return {
-            "image": image[np.newaxis, :, :],  # [Z, Y, X] for consistency
+            "image": image,
             "voxel_spacing": voxel_spacing,
             "orientation": self._compute_affine_single(ds),
             "metadata": metadata,
@@ -107,40 +268,31 @@ class DataLoader:
         if not dicom_files:
             raise ValueError(f"No files found in {folder_path}")
 
-        dicoms = []
-        for f in dicom_files:
-            try:
-                ds = pydicom.dcmread(f, stop_before_pixels=True)
-                dicoms.append(ds)
-            except Exception as e:
-                print(f"⚠️ Skipping {f}: not a valid DICOM ({e})")
+        # Validate every file in parallel (map keeps the directory order)
+        if len(dicom_files) >= DICOM_PROCESS_MIN_FILES:
+            with ProcessPoolExecutor(mp_context=multiprocessing.get_context("spawn")) as ex:
+                headers = list(ex.map(_read_dicom_header, dicom_files, chunksize=DICOM_PROCESS_CHUNKSIZE))
+        else:
+            with ThreadPoolExecutor(max_workers=min(DICOM_READ_WORKERS, len(dicom_files))) as ex:
+                headers = list(ex.map(_read_dicom_header, dicom_files))
+        dicoms = [ds for ds in headers if ds is not None]
 
         if not dicoms:
             raise ValueError(f"No valid DICOM files in {folder_path}")
         
-        first_ds = next((pydicom.dcmread(f) for f in dicom_files), None)
-        if not first_ds:
-            raise ValueError("No valid DICOM found")
-
-        # Convert series to temporary NIfTI
-        with tempfile.TemporaryDirectory() as temp_dir:
-            output_nii = Path(temp_dir) / "series.nii.gz"
-            dicom2nifti.convert_directory(folder_path, temp_dir, compression=True, reorient=True)
-
-            # Find the generated NIfTI file
-            nii_files = [f for f in Path(temp_dir).iterdir() if f.suffixes == ['.nii', '.gz']]
-            if not nii_files:
-                raise ValueError("No NIfTI files generated from DICOM series")
-            
-            # Pick the largest (likely most slices)
-            output_nii = max(nii_files, key=lambda f: f.stat().st_size)
-
-            # Load the generated NIfTI
-            nii = nib.load(str(output_nii))
-            image = nii.get_fdata(dtype=np.float32)
-            affine = nii.affine
-            header = nii.header
-            voxel_spacing = tuple(header.get_zooms()[:3])
+        # A folder may hold several series (localizers, reformats...): keep the
+        # largest, whose slices are the only ones that get their pixels read
+        series = {}
+        for ds in dicoms:
+            series.setdefault(getattr(ds, "SeriesInstanceUID", None), []).append(ds)
+        dicoms = max(series.values(), key=len)
+
+        # Metadata only needs the header, which was just read
+        first_ds = dicoms[0]
+
+        # Stack the slices straight into the volume (the viewer reorients it to
+        # the closest canonical orientation itself)
+        image, affine, voxel_spacing = self._stack_dicom_series(dicoms)
 
         return {
             "image": image,
@@ -150,6 +302,148 @@ class DataLoader:
             "format": "dicom",  # Still mark as DICOM origin
         }
 
+    def _stack_dicom_series(self, dicoms: List[FileDataset]) -> tuple:
+        """
+        Assemble a [X, Y, Z] volume and its RAS affine from a series' headers,
+        reading each slice's pixels once straight into a preallocated array.
+        The volume is int16 when every slice rescales to exact integers in range,
+        float32 otherwise
+        """
+        first = dicoms[0]
+        try:
+            orient = np.array(first.ImageOrientationPatient, dtype=float).reshape(2, 3)
+            normal = np.cross(orient[0], orient[1])
+            # All slice positions as one [N, 3] array, ordered along the normal
+            # (InstanceNumber if positions are missing)
+            positions = np.fromiter((d.ImagePositionPatient for d in dicoms),
+                                    dtype=np.dtype((float, 3)), count=len(dicoms))
+            order = np.argsort(positions @ normal, kind="stable")
+            dicoms = [dicoms[i] for i in order]
+            positions = positions[order]
+        except Exception:
+            orient = np.array([[1, 0, 0], [0, 1, 0]], dtype=float)
+            normal = np.array([0, 0, 1], dtype=float)
+            dicoms = sorted(dicoms, key=lambda d: int(getattr(d, "InstanceNumber", 0)))
+            positions = None
+
+        # Rescale comes from the header scan, no need to keep the full datasets
+        rescales = [(float(getattr(d, 'RescaleSlope', 1.0)), float(getattr(d, 'RescaleIntercept', 0.0)))
+                    for d in dicoms]
+        exact = all(slope == 1.0 and intercept.is_integer() for slope, intercept in rescales)
+
+        rows, cols = int(first.Rows), int(first.Columns)
+        # Fortran order: each slice (transposed to [X, Y]) is one contiguous block
+        image = np.empty((cols, rows, len(dicoms)), dtype=np.int16 if exact else np.float32, order="F")
+        for i, (ds, (slope, intercept)) in enumerate(zip(dicoms, rescales)):
+            pixels = _read_native_pixels(ds)
+            if pixels is None:
+                # Large elements other than the pixels are only read if accessed; the
+                # full dataset is dropped as soon as its pixels are decoded
+                pixels = pydicom.dcmread(ds.filename, defer_size="1 KB").pixel_array
+            pixels = pixels.T
+            if image.dtype == np.int16 and not _fits_int16(pixels, int(intercept)):
+                image = image.astype(np.float32, order="F")
+            image[:, :, i] = pixels
+            if slope != 1.0:
+                image[:, :, i] *= slope
+            if intercept != 0.0:
+                image[:, :, i] += image.dtype.type(intercept)
+
+        dy, dx, dz = self._get_dicom_spacing(first)
+        if positions is not None and len(dicoms) > 1:
+            # Mean step over the whole stack, so a repeated or missing position
+            # between two neighbours doesn't skew it
+            dz = float(np.dot(normal, positions[-1] - positions[0])) / (len(dicoms) - 1) or dz
+        origin = positions[0] if positions is not None else getattr(dicoms[0], "ImagePositionPatient", (0, 0, 0))
+        affine = _dicom_affine(orient.ravel(), dx, dy, dz, origin)
+        affine[:2, :] *= -1  # DICOM LPS -> NIfTI RAS
+        return image, affine, (dx, dy, abs(dz))
+
+    # ---------------------------------------------------------------
+    # Load cache
+    # ---------------------------------------------------------------
+    @staticmethod
+    def _compute_cache_key(path: str) -> Optional[str]:
+        """
+        Hash of the input's path, mtime and size; for a folder, of every member
+        file's (name, mtime, size), so slices rewritten in place change it too
+        """
+        if not LOAD_CACHE_ENABLED:
+            return None
+        try:
+            if os.path.isdir(path):
+                with os.scandir(path) as it:
+                    members = sorted((e.name, e.stat().st_mtime_ns, e.stat().st_size)
+                                     for e in it if e.is_file())
+                ident = f"{os.path.abspath(path)}|{members}"
+            else:
+                st = os.stat(path)
+                ident = f"{os.path.abspath(path)}|{st.st_mtime_ns}|{st.st_size}"
+        except OSError:
+            return None
+        return hashlib.blake2b(ident.encode("utf-8"), digest_size=16).hexdigest()
+
+    def _cache_paths(self) -> tuple:
+        base = os.path.join(LOAD_CACHE_DIR, self._cache_key)
+        return base + ".npy", base + ".pkl"
+
+    def _read_cache(self) -> Optional[Dict[str, Any]]:
+        """Previously decoded data for this input, with the image memory-mapped (copy-on-write)"""
+        if self._cache_key is None:
+            return None
+        image_path, meta_path = self._cache_paths()
+        if not (os.path.exists(image_path) and os.path.exists(meta_path)):
+            return None
+        try:
+            with open(meta_path, "rb") as f:
+                data = pickle.load(f)
+            data["image"] = np.load(image_path, mmap_mode="c")
+            os.utime(image_path)  # mark as recently used for pruning
+            return data
+        except Exception as e:
+            print(f"⚠️ Ignoring unreadable load cache entry {self._cache_key}: {e}")
+            return None
+
+    def _write_cache(self, data: Dict[str, Any]) -> None:
+        """Queue decoded data to be stored for the next load of the same input"""
+        global _cache_writer
+        # NIfTI images stay lazy proxies, caching one would decode it all up front
+        if self._cache_key is None or data.get("lazy"):
+            return
+        if _cache_writer is None:
+            _cache_writer = ThreadPoolExecutor(max_workers=1)
+        # The image isn't modified after loading, the writer only reads it
+        entry = {k: v for k, v in data.items() if k != "image"}
+        entry["metadata"] = {k: v for k, v in data.get("metadata", {}).items() if k not in DICOM_PHI_FIELDS}
+        _cache_writer.submit(self._save_cache_entry, self._cache_paths(), data["image"], entry)
+
+    @classmethod
+    def _save_cache_entry(cls, paths: tuple, image: np.ndarray, entry: Dict[str, Any]) -> None:
+        """Write one cache entry (runs on the writer thread), dropping the oldest entries"""
+        image_path, meta_path = paths
+        try:
+            os.makedirs(LOAD_CACHE_DIR, exist_ok=True)
+            # Write under temporary names first so a crash never leaves half an entry
+            np.save(image_path + ".tmp.npy", np.asarray(image))
+            with open(meta_path + ".tmp", "wb") as f:
+                pickle.dump(entry, f)
+            os.replace(image_path + ".tmp.npy", image_path)
+            os.replace(meta_path + ".tmp", meta_path)
+            cls._prune_cache()
+        except Exception as e:
+            print(f"⚠️ Could not write load cache: {e}")
+
+    @staticmethod
+    def _prune_cache() -> None:
+        entries = [e for e in os.scandir(LOAD_CACHE_DIR) if e.name.endswith(".npy") and not e.name.endswith(".tmp.npy")]
+        entries.sort(key=lambda e: e.stat().st_mtime, reverse=True)
+        for entry in entries[LOAD_CACHE_MAX_ENTRIES:]:
+            for path in (entry.path, entry.path[:-len(".npy")] + ".pkl"):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
     # ---------------------------------------------------------------
     # Helper methods
     # ---------------------------------------------------------------
@@ -163,34 +457,31 @@ class DataLoader:
             return (1.0, 1.0, 1.0)
     
     def _apply_dicom_rescale(self, image: np.ndarray, ds: FileDataset) -> np.ndarray:
-        """Apply rescale slope/intercept to DICOM pixel data"""
+        """Apply rescale slope/intercept to DICOM pixel data, in place (integer images only take an integer intercept)"""
         slope = float(getattr(ds, 'RescaleSlope', 1.0))
         intercept = float(getattr(ds, 'RescaleIntercept', 0.0))
-        return image * slope + intercept
+        if image.dtype.kind != "f":
+            intercept = image.dtype.type(intercept)
+        if slope != 1.0:
+            np.multiply(image, slope, out=image)
+        if intercept != 0.0:
+            np.add(image, intercept, out=image)
+        return image
 
     def _extract_metadata(self, ds: FileDataset) -> Dict[str, Any]:
         """Extract relevant metadata safely."""
-        fields = [
-            "PatientName", "PatientID", "PatientAge", "PatientSex",
-            "StudyDescription", "SeriesDescription", "Modality",
-            "StudyDate", "Manufacturer", "SliceThickness", "Rows", "Columns",
-        ]
         md = {}
-        for field in fields:
-            val = getattr(ds, field, None)
-            if val is not None:
-                md[field] = val # keep original type
+        for tag, field in _METADATA_TAGS:
+            elem = ds.get(tag)
+            if elem is not None and elem.value is not None:
+                md[field] = elem.value # keep original type
         return md
 
     def _compute_affine_single(self, ds: FileDataset) -> np.ndarray:
         """Compute approximate affine for single DICOM slice."""
         try:
-            orient = np.array(ds.ImageOrientationPatient, dtype=float).reshape(2, 3)
-            row_dir, col_dir = orient
-            normal_dir = np.cross(row_dir, col_dir)
-            affine = np.eye(4)
-            affine[:3, :3] = np.vstack((row_dir, col_dir, normal_dir)).T * [*ds.PixelSpacing, float(getattr(ds, "SliceThickness", 1.0))]
-            affine[:3, 3] = np.array(ds.ImagePositionPatient, dtype=float)
-            return affine
+            spacing_0, spacing_1 = (float(v) for v in ds.PixelSpacing)
+            return _dicom_affine(ds.ImageOrientationPatient, spacing_0, spacing_1,
+                                 float(getattr(ds, "SliceThickness", 1.0)), ds.ImagePositionPatient)
         except Exception:
             return np.eye(4)
\ No newline at end of file
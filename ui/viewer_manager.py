@@ -5,7 +5,38 @@ import nibabel as nib
 import numpy as np
 import cv2
 from scipy.ndimage import map_coordinates
+try:
+    from numba import njit
+except ImportError:
+    njit = None
 
+# Dtype volumes are read in for display; float32 is plenty for intensities and
+# half the memory of nibabel's float64 default
+VOLUME_DTYPE = np.float32
+# 4-neighbour structuring element for the outline erosion without numba
+_OUTLINE_KERNEL = np.array([[0, 1, 0], [1, 1, 1], [0, 1, 0]], dtype=np.uint8)
+
+
+if njit is not None:
+    @njit(cache=True, boundscheck=False)
+    def _outline_scan(mask, out):
+        """
+        Outline of a 2D mask in one pass: 255 where a voxel is inside (> 0) and a
+        4-neighbour is outside or off the edge, 0 elsewhere (NaN counts as outside)
+        """
+        h, w = mask.shape
+        for i in range(h):
+            for j in range(w):
+                if not mask[i, j] > 0:
+                    out[i, j] = 0
+                elif (i == 0 or j == 0 or i == h - 1 or j == w - 1
+                        or not mask[i - 1, j] > 0 or not mask[i + 1, j] > 0
+                        or not mask[i, j - 1] > 0 or not mask[i, j + 1] > 0):
+                    out[i, j] = 255
+                else:
+                    out[i, j] = 0
+else:
+    _outline_scan = None
 
 class ViewerManager(QFrame):
     def __init__(self, loaded_nifti=None, segmentation_mask=None, main_organ=None, orientation=None):
@@ -138,7 +169,9 @@ class ViewerManager(QFrame):
         self.affine = self.img_ras.affine
         self.inv_affine = np.linalg.inv(self.affine)
         
-        self.data = self.img_ras.get_fdata()
+        # The proxy is read once here; nibabel caches the array on img_ras so the
+        # fourth view's reads of the same dtype reuse it
+        self.data = self.img_ras.get_fdata(dtype=VOLUME_DTYPE)
         shape = np.array(self.data.shape)
         
         # Initialize cursor at center (in voxel coordinates)
@@ -1267,9 +1300,11 @@ class FourthView(QFrame):
         if nifti is None:
             raise RuntimeError("manager.img_ras (Nifti1Image) required by FourthView")
 
-        self.vol = nifti.get_fdata()
+        self.vol = nifti.get_fdata(dtype=VOLUME_DTYPE)
         self.affine = nifti.affine
         self.mask_data = None
+        # uint8 outline image, reused while the slice shape stays the same
+        self._outline_buf = None
 
         self.base_view = getattr(self.manager, 'base_view_to4th', 'axial')
 
@@ -1325,11 +1360,10 @@ class FourthView(QFrame):
         delta = event.angleDelta().y() // 120
         if delta == 0:
             return
-        new_slice = int(np.clip(self.current_slice - delta, 0, max(0, self.max_slices - 1)))
+        new_slice = min(max(self.current_slice - delta, 0), max(0, self.max_slices - 1))
         if new_slice != self.current_slice:
-            self.current_slice = new_slice
+            # valueChanged -> _on_scroll_changed stores the slice and redraws, once
             self.side_bar.setValue(new_slice)
-            self.update_view()
 
     def resizeEvent(self, event):
         super().resizeEvent(event)
@@ -1375,7 +1409,7 @@ class FourthView(QFrame):
 
         nifti = getattr(self.manager, 'img_ras', None)
         if nifti is not None:
-            self.vol = nifti.get_fdata()
+            self.vol = nifti.get_fdata(dtype=VOLUME_DTYPE)
             self.affine = nifti.affine
 
         mode = getattr(self.manager, 'fourth_view_mode', 'oblique')
@@ -1539,22 +1573,32 @@ class FourthView(QFrame):
         if mask_obj is None:
             return False
         if isinstance(mask_obj, np.ndarray):
-            self.mask_data = mask_obj
+            self.mask_data = self._compact_mask(mask_obj)
             return True
         if isinstance(mask_obj, str):
             try:
                 nif = nib.load(mask_obj)
                 nif = nib.as_closest_canonical(nif)
-                self.mask_data = nif.get_fdata()
+                # Nothing else uses this image, don't keep a cached copy on it
+                self.mask_data = self._compact_mask(nif.get_fdata(caching='unchanged', dtype=VOLUME_DTYPE))
                 return True
             except Exception:
                 return False
         try:
-            self.mask_data = mask_obj.get_fdata()
+            self.mask_data = self._compact_mask(mask_obj.get_fdata(caching='unchanged', dtype=VOLUME_DTYPE))
             return True
         except Exception:
             return False
 
+    @staticmethod
+    def _compact_mask(mask):
+        """
+        Mask as 0/1 uint8 (NaN -> 0), thresholded once instead of per slice and in
+        Fortran order so axial slices (the default base view) are contiguous
+        """
+        with np.errstate(invalid='ignore'):
+            return np.asfortranarray(np.greater(mask, 0).view(np.uint8))
+
     def _display_outline(self):
         if not self._ensure_mask_loaded():
             self.img_label.clear()
@@ -1583,14 +1627,19 @@ class FourthView(QFrame):
             mask_slice = mask[:, int(slice_idx), :]
             mask_slice = np.fliplr(np.rot90(mask_slice, k=1))
 
-        mask_bin = (np.nan_to_num(mask_slice) > 0).astype(np.uint8) * 255
-        mask_bin = np.ascontiguousarray(mask_bin)
-        contours, _ = cv2.findContours(mask_bin, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        outline_img = np.zeros_like(mask_bin, dtype=np.uint8)
-        if contours:
-            cv2.drawContours(outline_img, contours, -1, color=255, thickness=1)
-        img = self._normalize_img(outline_img)
-        self._set_pixmap(img)
+        # Outline = mask minus its 4-neighbour erosion, fused into one pass with numba
+        outline_img = self._outline_buf
+        if outline_img is None or outline_img.shape != mask_slice.shape:
+            outline_img = self._outline_buf = np.empty(mask_slice.shape, dtype=np.uint8)
+        if _outline_scan is not None:
+            _outline_scan(mask_slice, outline_img)
+        else:
+            mask_bin = mask_slice * np.uint8(255)
+            eroded = cv2.erode(mask_bin, _OUTLINE_KERNEL, borderType=cv2.BORDER_CONSTANT, borderValue=0)
+            np.subtract(mask_bin, eroded, out=outline_img)
+        # Already 0/255 uint8, and never flipped (outline and oblique modes are
+        # exclusive), so no normalization; _set_pixmap copies it into the QImage
+        self._set_pixmap(outline_img)
 
     # -------------------------
     # image conversions